@@ -2,11 +2,20 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: str | None = None # Defaults to DATABASE_URL with its async driver
+
+    # Connection pool, per engine (sync and async) and per worker process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30 # Seconds to wait for a free connection before erroring
+    DB_POOL_RECYCLE: int = 300 # Seconds; -1 disables
+    DB_POOL_PRE_PING: bool = True # Ping on every checkout; disable when DB_POOL_RECYCLE already drops idle connections
     SECRET_KEY: str
     ADMIN_USERNAME: str
     ADMIN_PASSWORD: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ALGORITHM: str = "HS256"
+    PASSWORD_HASH_WORKERS: int | None = None # Max concurrent password hash/verify operations (default: half the CPUs)
     
     MAIL_USERNAME: str | None = None
     MAIL_PASSWORD: str | None = None
@@ -17,6 +26,10 @@ class Settings(BaseSettings):
     MAIL_TO: str | None = None
     
     REPORT_INTERVAL_MINUTES: int = 1440 # Default to 24 hours if not set
+    REPORT_FANOUT: bool = True # Per SRH/DRSM/DO scope reports; False sends one full report to MAIL_TO only
+    REPORT_WORKERS: int = 1 # Processes rendering PDF reports; 0 renders on a thread in the API process
+    REPORT_TIMEOUT_SECONDS: int = 600 # A render taking longer is stopped and reported as failed
+    REPORT_TMP_DIR: str | None = None # Scratch files of the scoped report run (default: system temp dir)
 
     WHATSAPP_TOKEN: str | None = None
     WHATSAPP_PHONE_ID: str | None = None
@@ -24,6 +37,37 @@ class Settings(BaseSettings):
     
     DEFAULT_RO_NUMBER: str = ""
 
+    MEDIA_STORE_BACKEND: str = "local"
+    MEDIA_ROOT: str = "media"
+    MEDIA_NORMALIZE: bool = True # Strip metadata, downscale and re-encode uploaded photos in the background
+    MEDIA_MAX_DIMENSION: int = 1600 # Longest side, in pixels, after normalization
+    MEDIA_JPEG_QUALITY: int = 80
+    MEDIA_KEEP_ORIGINALS: bool = False # Keep the upload as received (feedback_media.original_sha256)
+    MEDIA_GC_GRACE_SECONDS: int = 900 # Unreferenced blobs put more recently than this are kept (an upload may not have committed its row yet)
+
+    DASHBOARD_CACHE_TTL_SECONDS: int = 60 # 0 disables the dashboard cache
+    DASHBOARD_CACHE_MAX_ENTRIES: int = 512
+    ACCESS_SCOPE_CACHE_TTL_SECONDS: int = 300
+    ACCESS_SCOPE_CACHE_MAX_ENTRIES: int = 2048
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 4096
+    BRANCH_REGISTRY_TTL_SECONDS: int = 300 # In-memory branch table is reloaded after this (picks up other workers' edits)
+
+    OUTBOX_WORKER_IN_PROCESS: bool = True # Run the outbox worker inside the API process; set False when running scripts/outbox_worker.py
+    OUTBOX_CONCURRENCY: int = 4 # Jobs executed at once per worker
+    OUTBOX_MAX_ATTEMPTS: int = 5 # Then the job is marked dead
+    OUTBOX_BACKOFF_SECONDS: int = 30 # First retry delay; doubles per attempt
+    OUTBOX_BACKOFF_MAX_SECONDS: int = 3600
+    OUTBOX_POLL_SECONDS: float = 2.0
+    OUTBOX_JOB_TIMEOUT_SECONDS: int = 120 # A running job is cancelled (and retried) after this; jobs rendering a report get REPORT_TIMEOUT_SECONDS on top
+    OUTBOX_RETENTION_DAYS: int = 7 # Done jobs are purged after this
+    NEGATIVE_ALERT_WINDOW_SECONDS: int = 600 # Negatives at an RO after its first alert are mailed as one digest when this window closes; 0 alerts each one
+
+    EXPORT_DIR: str = "exports" # Finished export job files
+    EXPORT_WORKERS: int = 1 # Export jobs running at once (each is a full scan)
+    EXPORT_RETENTION_HOURS: int = 24 # Finished jobs and their files are removed after this
+    EXPORT_HEARTBEAT_SECONDS: int = 30 # Active jobs whose process misses 4 heartbeats are failed
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
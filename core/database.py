@@ -1,4 +1,13 @@
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .config import settings
 
 connect_args = {}
@@ -10,7 +19,83 @@ database_url = settings.DATABASE_URL
 if database_url and database_url.startswith("postgres://"):
     database_url = database_url.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(database_url, connect_args=connect_args, pool_pre_ping=True, pool_recycle=300)
+# --- Pool instrumentation ---
+
+class PoolWaitStats:
+    """Histogram of how long checkouts waited for a pooled connection."""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.BUCKETS_MS) if ms <= bound), len(self.BUCKETS_MS))
+        with self._lock:
+            self.counts[index] += 1
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={b}ms" for b in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avgWaitMs": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0,
+                "maxWaitMs": round(self.max_wait * 1000, 3),
+                "histogram": dict(zip(labels, self.counts)),
+            }
+
+def _instrumented_pool(base):
+    """Pool class that times every checkout. Stats live on the class so they survive pool.recreate()."""
+    class InstrumentedPool(base):
+        wait_stats = PoolWaitStats()
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except sa_exc.TimeoutError:
+                self.wait_stats.record_timeout()
+                raise
+            self.wait_stats.record(time.perf_counter() - start)
+            return connection
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+def _pool_kwargs(url: str, pool_class) -> dict:
+    kwargs = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    # In-memory SQLite has to share a single connection; leave its default pool alone
+    if make_url(url).database in (None, "", ":memory:"):
+        return kwargs
+    kwargs.update(
+        poolclass=_instrumented_pool(pool_class),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return kwargs
+
+engine = create_engine(database_url, connect_args=connect_args, **_pool_kwargs(database_url, QueuePool))
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
@@ -18,3 +103,86 @@ def create_db_and_tables():
 def get_session():
     with Session(engine) as session:
         yield session
+
+# --- Async engine ---
+# Same database through an async driver, for routes that must not block the
+# event loop while waiting on queries. Created on first use so the async
+# drivers are only required when an async route is hit.
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+def to_async_url(url: str) -> str:
+    """Maps a sync DATABASE_URL (psycopg2/pymysql/sqlite) onto its async driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+
+    if backend == "postgresql":
+        # asyncpg takes `ssl` instead of libpq's `sslmode` and has no `channel_binding`
+        query = dict(parsed.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+        parsed = parsed.set(query=query)
+    return parsed.render_as_string(hide_password=False)
+
+_async_engine: Optional[AsyncEngine] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        url = settings.ASYNC_DATABASE_URL or to_async_url(database_url)
+        _async_engine = create_async_engine(url, **_pool_kwargs(url, AsyncAdaptedQueuePool))
+    return _async_engine
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+async def get_async_session():
+    # expire_on_commit=False: attribute access after commit must not trigger implicit IO
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+# --- Pool status ---
+
+def _engine_pool_status(sync_engine: Engine) -> dict:
+    pool = sync_engine.pool
+    status = {"poolClass": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checkedOut=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            maxConnections=pool.size() + pool._max_overflow,
+        )
+    stats = getattr(pool, "wait_stats", None)
+    if stats is not None:
+        status["checkoutWait"] = stats.snapshot()
+    return status
+
+def pool_status() -> dict:
+    """Checked-out/idle/overflow counts and checkout wait times for this process."""
+    status = {
+        "settings": {
+            "poolSize": settings.DB_POOL_SIZE,
+            "maxOverflow": settings.DB_MAX_OVERFLOW,
+            "poolTimeout": settings.DB_POOL_TIMEOUT,
+            "poolRecycle": settings.DB_POOL_RECYCLE,
+            "prePing": settings.DB_POOL_PRE_PING,
+        },
+        "sync": _engine_pool_status(engine),
+        "async": None,
+    }
+    if _async_engine is not None:
+        status["async"] = _engine_pool_status(_async_engine.sync_engine)
+    return status
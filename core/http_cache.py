@@ -0,0 +1,103 @@
+from typing import BinaryIO, Callable, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+# Image URLs name a feedback, not a content hash, and the blob behind one can be
+# replaced (e.g. normalized after upload), so clients must revalidate every use;
+# the strong ETag keeps that a body-less 304. "private" keeps customers' photos
+# out of shared caches and CDNs, including those from the unauthenticated
+# /feedback/{id}/image/{type}.
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(value: str) -> str:
+    """Strong ETag for an opaque value (e.g. a content hash)."""
+    return f'"{value}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers etag (weak comparison, as RFC 9110 requires for it)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def cache_headers(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL, vary: Optional[str] = None) -> dict:
+    # No Last-Modified: the blob behind a URL can change without its row's
+    # timestamp moving, so If-Modified-Since would answer 304 with stale bytes
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+def not_modified(headers: dict) -> Response:
+    """304 carrying the same validators/caching headers a 200 would have."""
+    return Response(status_code=304, headers=headers)
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single "bytes=" range, or None to send the
+    whole body (no/unsupported/multi-range header). Raises 416 if unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_s:
+            start = int(start_s)
+            end = min(int(end_s), size - 1) if end_s else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(size - int(end_s), 0), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def _iter_file(f: BinaryIO, start: int, length: int):
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+def blob_response(request: Request, etag: str, size: int, media_type: str,
+                  open_blob: Callable[[], Optional[BinaryIO]]) -> Response:
+    """
+    Conditional, range-aware response for a content-hashed blob. 304s are decided
+    from the ETag alone; open_blob is only called when a body is sent.
+    """
+    headers = cache_headers(etag)
+    if etag_matches(request, etag):
+        return not_modified(headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is unusable: send everything
+    if not if_range or if_range.strip() == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    f = open_blob()
+    if f is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers["Accept-Ranges"] = "bytes"
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_iter_file(f, 0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file(f, start, end - start + 1), status_code=206, media_type=media_type, headers=headers)
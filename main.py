@@ -3,12 +3,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 
-from core.database import create_db_and_tables
+from sqlmodel import Session
+from core.database import create_db_and_tables, engine, dispose_async_engine
+from services.rollup import ensure_rollup
+from services.branch_registry import branch_registry
+from services.export_jobs import fail_interrupted_export_jobs
 from services.tasks import start_scheduler
+from services.reports import shutdown_report_pool
+from services.outbox import run_worker
+from core.config import settings
 from core.logger import get_logger
-from routers import feedback, admin, admin_portal, auth, users, whatsapp, branches
+from routers import feedback, admin, admin_portal, auth, users, whatsapp, branches, monitoring
 
 logger = get_logger(__name__)
 
@@ -16,10 +24,22 @@ logger = get_logger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     create_db_and_tables()
+    with Session(engine) as session:
+        ensure_rollup(session)
+        branch_registry.load(session)
+        fail_interrupted_export_jobs(session)
     start_scheduler()
+    # Set OUTBOX_WORKER_IN_PROCESS=false when running scripts/outbox_worker.py instead
+    outbox_stop = asyncio.Event()
+    outbox_task = asyncio.create_task(run_worker(outbox_stop)) if settings.OUTBOX_WORKER_IN_PROCESS else None
     logger.info("Application started")
     yield
     # Shutdown
+    if outbox_task:
+        outbox_stop.set()
+        await outbox_task
+    shutdown_report_pool()
+    await dispose_async_engine()
     logger.info("Application shutting down")
 
 app = FastAPI(lifespan=lifespan)
@@ -49,6 +69,7 @@ app.include_router(admin_portal.router)
 app.include_router(users.router)
 app.include_router(whatsapp.router)
 app.include_router(branches.router)
+app.include_router(monitoring.router)
 
 # Serve frontend files
 frontend_dist = "frontend-survey/dist"
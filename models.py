@@ -1,8 +1,15 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, SQLModel, UniqueConstraint, Index
 
 class Feedback(SQLModel, table=True):
+    # Composite indexes for the default created_at desc sort (and keyset cursors)
+    # under each RBAC filter: unrestricted, by ro_number (RO / mapped hierarchy) and by status
+    __table_args__ = (
+        Index("ix_feedback_created_at_id", "created_at", "id"),
+        Index("ix_feedback_ro_number_created_at_id", "ro_number", "created_at", "id"),
+        Index("ix_feedback_status_created_at_id", "status", "created_at", "id"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     phone: str
     is_testimonial: bool = False
@@ -36,6 +43,83 @@ class Feedback(SQLModel, table=True):
     branch_code: Optional[str] = Field(default=None, index=True)
     ro_code: Optional[str] = None
 
+class FeedbackMedia(SQLModel, table=True):
+    __tablename__ = "feedback_media"
+    __table_args__ = (UniqueConstraint("feedback_id", "kind"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    feedback_id: int = Field(foreign_key="feedback.id", index=True)
+    kind: str # air, washroom, water, receipt
+    sha256: str = Field(index=True) # Content address in the media store
+    size: int
+    content_type: str = Field(default="image/jpeg")
+    original_sha256: Optional[str] = Field(default=None, index=True) # Upload as received, if kept after normalization
+    processed: bool = Field(default=False, index=True) # Normalized (or checked and left as is) by services/media_ingest.py
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class FeedbackDailyRollup(SQLModel, table=True):
+    """Feedback counts per day x RO x status x ratings, maintained on every feedback write."""
+    __tablename__ = "feedback_daily_rollup"
+    __table_args__ = (
+        Index("ix_feedback_daily_rollup_day_ro", "day", "ro_number"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date
+    ro_number: Optional[str] = None
+    status: str
+    rating_air: Optional[int] = None
+    rating_washroom: Optional[int] = None
+    rating_water: Optional[int] = None
+    count: int = 0
+
+class ExportJob(SQLModel, table=True):
+    """Background feedback export; identical in-flight requests share one job (same fingerprint)."""
+    __tablename__ = "export_jobs"
+    id: str = Field(primary_key=True) # uuid4 hex
+    fingerprint: str = Field(index=True) # sha256 of visible RO set + filters + format
+    requested_by: str = Field(index=True) # username
+    format: str = Field(default="csv") # csv (gzip) or xlsx
+    params: str = Field(default="{}") # JSON: filters and the resolved ro_codes
+    status: str = Field(default="queued", index=True) # queued -> running -> done | failed
+    row_count: Optional[int] = None
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    worker_id: Optional[str] = None # host:pid of the process whose executor holds the job
+    heartbeat_at: Optional[datetime] = None # Refreshed by that process while the job is queued/running
+
+class OutboxJob(SQLModel, table=True):
+    """Side effect (WhatsApp message, alert email) committed with the write that caused it; run by services/outbox.py."""
+    __tablename__ = "outbox_jobs"
+    __table_args__ = (
+        Index("ix_outbox_jobs_status_available", "status", "available_at"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(index=True) # Handler name, see services/outbox.py
+    payload: str = Field(default="{}") # JSON
+    status: str = Field(default="pending") # pending -> running -> done | dead
+    attempts: int = 0
+    max_attempts: int = 5
+    available_at: datetime = Field(default_factory=datetime.utcnow) # Not run before this (retry backoff)
+    locked_by: Optional[str] = None # Worker that claimed it
+    locked_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+class NegativeAlert(SQLModel, table=True):
+    """One negative feedback and how it was alerted; services/negative_alerts.py coalesces these per RO."""
+    __tablename__ = "negative_alerts"
+    __table_args__ = (
+        Index("ix_negative_alerts_ro_created", "ro_code", "created_at"),
+    )
+    feedback_id: int = Field(primary_key=True) # No FK: alerts outlive deleted feedback until purged
+    ro_code: str # "-" when the feedback has no RO
+    mode: str # immediate (opened a window) | digest (collected until the window closes)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    digest_sent_at: Optional[datetime] = None
+
 class AdminUser(SQLModel, table=True):
     __tablename__ = "admin_users"
     id: Optional[str] = Field(primary_key=True)
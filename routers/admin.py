@@ -1,21 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlmodel import Session, select
 from typing import List
 import os
-import io
 import base64
 from datetime import date, datetime, timedelta
 from jose import JWTError, jwt
-from PIL import Image
 from sqlalchemy import func, case
-from fastapi.responses import StreamingResponse, Response
+from fastapi.responses import Response
 
 from core.database import get_session
 from models import Feedback, FeedbackRead, SurveyListRead, SurveyDetailRead
 from core.config import settings
 from core.security import create_access_token, verify_password, get_password_hash
 from core.logger import get_logger
+from core.http_cache import make_etag, etag_matches, cache_headers, not_modified, blob_response
+from services.media_store import PHOTO_KINDS, get_photo_source, load_feedback_photo, delete_feedback_media, delete_blob_if_unreferenced
+from services.thumbnails import (
+    THUMBNAIL_FORMATS, pick_size, pick_format, thumbnail_etag_value, get_or_create_thumbnail,
+)
+from services.feedback_query import select_feedbacks_with_photo_flags, photo_flags, get_feedback, feedback_to_dict
+from services.pagination import apply_keyset, next_cursor
+from services.rollup import rollup_key, record_feedback_change
+from services.cache import dashboard_cache
+from services.negative_alerts import delete_negative_alert
 
 logger = get_logger(__name__)
 
@@ -57,16 +66,15 @@ async def get_reports(
     current_user: str = Depends(get_current_admin)
 ):
     try:
-        feedbacks = session.exec(select(Feedback)).all()
+        # Blob columns stay deferred; only photos the flags say exist are loaded
+        rows = session.exec(select_feedbacks_with_photo_flags()).all()
         results = []
-        for f in feedbacks:
-            f_dict = f.model_dump()
-            if f.photo_air:
-                f_dict['photo_air'] = base64.b64encode(f.photo_air).decode('utf-8')
-            if f.photo_washroom:
-                f_dict['photo_washroom'] = base64.b64encode(f.photo_washroom).decode('utf-8')
-            if f.photo_receipt:
-                f_dict['photo_receipt'] = base64.b64encode(f.photo_receipt).decode('utf-8')
+        for row in rows:
+            f, flags = row[0], photo_flags(row)
+            f_dict = feedback_to_dict(f)
+            for kind in ("air", "washroom", "receipt"):
+                data = load_feedback_photo(session, f, kind) if flags[kind] else None
+                f_dict[f'photo_{kind}'] = base64.b64encode(data).decode('utf-8') if data else None
             results.append(FeedbackRead(**f_dict))
         return results
     except Exception as e:
@@ -80,12 +88,22 @@ async def delete_feedback(
     current_user: str = Depends(get_current_admin)
 ):
     try:
-        feedback = session.get(Feedback, feedback_id)
+        feedback = get_feedback(session, feedback_id)
         if not feedback:
             logger.warning(f"Attempt to delete non-existent feedback: {feedback_id}")
             raise HTTPException(status_code=404, detail="Feedback not found")
+        media_keys = delete_feedback_media(session, feedback_id)
+        delete_negative_alert(session, feedback_id)
+        record_feedback_change(session, rollup_key(feedback), None)
         session.delete(feedback)
         session.commit()
+        # Only now that the rows are gone for good; a leftover blob is harmless, a missing one is not
+        for key in media_keys:
+            try:
+                delete_blob_if_unreferenced(session, key)
+            except Exception as e:
+                logger.warning(f"Could not delete media blob {key} of feedback {feedback_id}: {e}")
+        dashboard_cache.invalidate()
         logger.info(f"Feedback deleted: {feedback_id}")
         return {"ok": True}
     except HTTPException:
@@ -102,7 +120,7 @@ async def update_feedback_status(
     current_user: str = Depends(get_current_admin)
 ):
     try:
-        feedback = session.get(Feedback, feedback_id)
+        feedback = get_feedback(session, feedback_id)
         if not feedback:
             raise HTTPException(status_code=404, detail="Feedback not found")
         
@@ -113,12 +131,15 @@ async def update_feedback_status(
         if new_status not in ["pending", "resolved", "Reviewed"]:
              raise HTTPException(status_code=400, detail="Invalid status")
 
+        before = rollup_key(feedback)
         feedback.status = new_status
+        record_feedback_change(session, before, rollup_key(feedback))
         session.add(feedback)
         session.commit()
+        dashboard_cache.invalidate()
         session.refresh(feedback)
         logger.info(f"Feedback {feedback_id} status updated to {new_status}")
-        return feedback
+        return feedback_to_dict(feedback)
     except HTTPException:
         raise
     except Exception as e:
@@ -360,43 +381,62 @@ async def get_surveys(
     date_to: date = None,
     sort_by: str = "created_at",
     order: str = "desc",
+    cursor: str = None, # Keyset pagination: pass next_cursor from the previous page instead of page
+    include_total: bool = True,
     session: Session = Depends(get_session),
     current_user: str = Depends(get_current_admin)
 ):
     try:
-        offset = (page - 1) * limit
-        query = select(Feedback)
-        
-        if ro_code:
-            query = query.where(Feedback.ro_number == ro_code)
-        if status:
-            if status.lower() == "reviewed":
-                query = query.where(Feedback.status == "Reviewed")
-            elif status.lower() == "pending":
-                query = query.where(Feedback.status == "Pending")
-        if date_from:
-            query = query.where(Feedback.created_at >= datetime.combine(date_from, datetime.min.time()))
-        if date_to:
-            query = query.where(Feedback.created_at <= datetime.combine(date_to, datetime.max.time()))
-        if search:
-            query = query.where((Feedback.phone.contains(search)) | (Feedback.id == search) | (Feedback.comment.contains(search)))
-
-        total_count = len(session.exec(query).all())
-
-        if hasattr(Feedback, sort_by):
+        def apply_filters(query):
+            if ro_code:
+                query = query.where(Feedback.ro_number == ro_code)
+            if status:
+                if status.lower() == "reviewed":
+                    query = query.where(Feedback.status == "Reviewed")
+                elif status.lower() == "pending":
+                    query = query.where(Feedback.status == "Pending")
+            if date_from:
+                query = query.where(Feedback.created_at >= datetime.combine(date_from, datetime.min.time()))
+            if date_to:
+                query = query.where(Feedback.created_at <= datetime.combine(date_to, datetime.max.time()))
+            if search:
+                query = query.where((Feedback.phone.contains(search)) | (Feedback.id == search) | (Feedback.comment.contains(search)))
+            return query
+
+        total_count = None
+        if include_total:
+            total_count = session.exec(apply_filters(select(func.count(Feedback.id)))).one()
+
+        query = apply_filters(select_feedbacks_with_photo_flags())
+
+        # Keyset pagination is keyed on (created_at, id); other sort columns use OFFSET
+        keyset = sort_by == "created_at" or not hasattr(Feedback, sort_by)
+        if cursor and not keyset:
+            raise HTTPException(status_code=400, detail="Cursor pagination is only supported when sorting by created_at")
+
+        if keyset:
+            try:
+                query = apply_keyset(query, Feedback.created_at, cursor, descending=order == "desc")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        else:
             col = getattr(Feedback, sort_by)
             if order == "desc":
                 query = query.order_by(col.desc())
             else:
                 query = query.order_by(col.asc())
-        else:
-             query = query.order_by(Feedback.created_at.desc())
 
-        query = query.offset(offset).limit(limit)
-        results = session.exec(query).all()
+        if not cursor:
+            query = query.offset((page - 1) * limit)
+        # Fetch one extra row to know whether there is a next page
+        results = session.exec(query.limit(limit + 1)).all()
+        has_more = len(results) > limit
+        results = results[:limit]
         
         surveys = []
-        for r in results:
+        for row in results:
+            r = row[0]
+            has_photo = photo_flags(row)
             surveys.append(SurveyListRead(
                 id=r.id,
                 submission_date=r.created_at,
@@ -404,9 +444,9 @@ async def get_surveys(
                 ro_code=r.ro_number,
                 rating_air=get_rating_emoji(r.rating_air),
                 rating_washroom=get_rating_emoji(r.rating_washroom),
-                has_receipt=bool(r.photo_receipt),
-                has_image_air=bool(r.photo_air),
-                has_image_washroom=bool(r.photo_washroom),
+                has_receipt=has_photo["receipt"],
+                has_image_air=has_photo["air"],
+                has_image_washroom=has_photo["washroom"],
                 comments_preview=r.comment[:50] + "..." if r.comment and len(r.comment) > 50 else r.comment,
                 status=r.status,
                 reviewed_at=r.reviewed_at,
@@ -417,8 +457,11 @@ async def get_surveys(
             "surveys": surveys,
             "total_count": total_count,
             "page": page,
-            "total_pages": (total_count + limit - 1) // limit
+            "total_pages": (total_count + limit - 1) // limit if total_count is not None else None,
+            "next_cursor": next_cursor(results[-1][0], "created_at") if keyset and has_more else None
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching surveys: {e}")
         raise HTTPException(status_code=500, detail="Error fetching surveys")
@@ -429,10 +472,12 @@ async def get_survey_detail(
     session: Session = Depends(get_session),
     current_user: str = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, feedback_id)
-    if not feedback:
+    row = session.exec(select_feedbacks_with_photo_flags().where(Feedback.id == feedback_id)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Survey not found")
-        
+
+    feedback = row[0]
+    has_photo = photo_flags(row)
     return SurveyDetailRead(
         id=feedback.id,
         submission_date=feedback.created_at,
@@ -444,9 +489,9 @@ async def get_survey_detail(
         status=feedback.status,
         reviewed_at=feedback.reviewed_at,
         reviewed_by=feedback.reviewed_by,
-        has_receipt=bool(feedback.photo_receipt),
-        has_image_air=bool(feedback.photo_air),
-        has_image_washroom=bool(feedback.photo_washroom)
+        has_receipt=has_photo["receipt"],
+        has_image_air=has_photo["air"],
+        has_image_washroom=has_photo["washroom"]
     )
 
 @router.patch("/surveys/{feedback_id}/mark-reviewed")
@@ -455,79 +500,91 @@ async def mark_reviewed(
     session: Session = Depends(get_session),
     current_user: str = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, feedback_id)
+    feedback = get_feedback(session, feedback_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Survey not found")
         
     if feedback.status == "Reviewed":
         return {"ok": True, "message": "Already reviewed"}
         
+    before = rollup_key(feedback)
     feedback.status = "Reviewed"
     feedback.reviewed_at = datetime.utcnow()
     feedback.reviewed_by = current_user
+    record_feedback_change(session, before, rollup_key(feedback))
     session.add(feedback)
     session.commit()
+    dashboard_cache.invalidate()
     session.refresh(feedback)
-    return {"ok": True, "message": "Marked as reviewed", "survey": feedback}
+    return {"ok": True, "message": "Marked as reviewed", "survey": feedback_to_dict(feedback)}
 
 @router.get("/surveys/{feedback_id}/images/{image_type}")
 async def get_survey_image(
+    request: Request,
     feedback_id: int,
     image_type: str,
     session: Session = Depends(get_session),
     current_user: str = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, feedback_id)
+    feedback = get_feedback(session, feedback_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Survey not found")
         
-    image_data = None
-    content_type = "image/jpeg"
-    
-    if image_type == "air":
-        image_data = feedback.photo_air
-    elif image_type == "washroom":
-        image_data = feedback.photo_washroom
-    elif image_type == "receipt":
-        image_data = feedback.photo_receipt
-        if image_data and image_data.startswith(b'%PDF'):
-            content_type = "application/pdf"
-    else:
+    if image_type not in PHOTO_KINDS:
         raise HTTPException(status_code=400, detail="Invalid image type")
-        
-    if not image_data:
+
+    source = get_photo_source(session, feedback, image_type)
+    if not source:
         raise HTTPException(status_code=404, detail="Image not found")
-        
-    return StreamingResponse(io.BytesIO(image_data), media_type=content_type)
+
+    return blob_response(request, make_etag(source.sha256), source.size, source.content_type, source.open)
 
 @router.get("/surveys/{feedback_id}/images/thumbnail/{image_type}")
 async def get_survey_thumbnail(
+    request: Request,
     feedback_id: int,
     image_type: str,
     size: int = 150,
     session: Session = Depends(get_session),
     current_user: str = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, feedback_id)
+    """
+    Thumbnail at the nearest fixed size (WebP if accepted, else JPEG). Rendered
+    once and kept next to the original in the media store; the ETag comes from
+    the original's hash, so revalidation never reads or decodes an image.
+    """
+    feedback = get_feedback(session, feedback_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Survey not found")
-        
-    image_data = None
-    if image_type == "air":
-        image_data = feedback.photo_air
-    elif image_type == "washroom":
-        image_data = feedback.photo_washroom
-    
-    if not image_data:
+
+    if image_type not in PHOTO_KINDS:
+        raise HTTPException(status_code=400, detail="Invalid image type")
+
+    size = pick_size(size)
+    fmt = pick_format(request.headers.get("accept"))
+
+    source = get_photo_source(session, feedback, image_type)
+    # PDF receipts have no thumbnail
+    if not source or source.content_type == "application/pdf":
         raise HTTPException(status_code=404, detail="Image not found")
-        
+
+    def load_source():
+        f = source.open()
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    headers = cache_headers(make_etag(thumbnail_etag_value(source.sha256, size, fmt)), vary="Accept")
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+
     try:
-        with Image.open(io.BytesIO(image_data)) as img:
-            img.thumbnail((size, size))
-            buf = io.BytesIO()
-            img.save(buf, format=img.format or "JPEG")
-            buf.seek(0)
-            return StreamingResponse(buf, media_type=f"image/{img.format.lower() if img.format else 'jpeg'}")
+        thumb = await run_in_threadpool(get_or_create_thumbnail, source.sha256, load_source, size, fmt)
     except Exception as e:
         logger.error(f"Error generating thumbnail: {e}")
         raise HTTPException(status_code=500, detail="Error generating thumbnail")
+    if thumb is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    return Response(content=thumb, media_type=THUMBNAIL_FORMATS[fmt][1], headers=headers)
@@ -2,57 +2,66 @@ from datetime import date, datetime, timedelta
 from typing import List, Optional, Union
 from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import Session, select, func, case, col
+from sqlalchemy import literal
 from sqlalchemy.orm import aliased
 import io
 import csv
+import os
 
-from core.database import get_session
-from models import Feedback, AdminUser, ReviewHistory, FOMapping, UserROMapping
-from models_refactor import Branch
+from core.database import engine, get_session, get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Feedback, FeedbackDailyRollup, AdminUser, ReviewHistory, FOMapping, UserROMapping, ExportJob
+from services.branch_registry import branch_registry
 from services.auth_service import get_current_admin
-from schemas.schemas import DashboardStats, ChartData, PieChartData, WorkflowUpdate
+from services.media_store import photo_exists_clause
+from services.feedback_query import select_feedbacks_with_photo_flags, photo_flags, get_feedback, feedback_to_dict, apply_common_filters
+from services.pagination import KEYSET_SORT_FIELDS, apply_keyset, next_cursor, estimate_count
+from services.rollup import rollup_key, record_feedback_change
+from services.cache import dashboard_cache, make_key
+from services.access_scope import AccessScope, get_access_scope, get_access_scope_async, apply_rbac
+from services.export_jobs import (
+    EXPORT_FORMATS, EXPORT_HEADER, parse_export_dates, export_query, export_row,
+    submit_export_job, can_access_job,
+)
+from schemas.schemas import DashboardStats, ChartData, PieChartData, WorkflowUpdate, ExportJobRequest
 
 router = APIRouter(prefix="/api", tags=["admin-portal"])
 
 # --- Helpers ---
 
-def apply_rbac(query, user: AdminUser):
-    """Applies Role-Based Access Control filters to the query."""
-    if user.role == "superuser" or user.role == "Vendor":
-        return query
-    elif user.role in ["DO", "FO", "DRSM", "SRH"]:
-        # Unified mapping logic for all hierarchy levels
-        # Checks the user_ro_mapping table for assigned ROs
-        sub = select(UserROMapping.ro_code).where(UserROMapping.username == user.username)
-        return query.where(Feedback.ro_number.in_(sub))
-    else:
-        # RO (or default admin) sees their branch
-        return query.where(Feedback.ro_number == user.branch_code)
+def dashboard_cache_key(scope: AccessScope, namespace: str, **params) -> tuple:
+    """Users with the same visible RO set share dashboard cache entries."""
+    ro_codes = None if scope.unrestricted else tuple(sorted(scope.ro_codes))
+    return make_key(namespace, ro_codes, **params)
 
-def apply_date_filter(query, start_date: Optional[Union[date, datetime]] = None, end_date: Optional[Union[date, datetime]] = None):
-    """Applies date range filters to the query."""
-    if start_date:
-        # If it's a date object, convert to datetime at start of day
-        dt_start = datetime.combine(start_date, datetime.min.time()) if isinstance(start_date, date) and not isinstance(start_date, datetime) else start_date
-        query = query.where(Feedback.created_at >= dt_start)
-    if end_date:
-        # If it's a date object, convert to datetime at end of day
-        dt_end = datetime.combine(end_date, datetime.max.time()) if isinstance(end_date, date) and not isinstance(end_date, datetime) else end_date
-        query = query.where(Feedback.created_at <= dt_end)
-    return query
-
-def apply_common_filters(query, user: AdminUser, ro_code: Optional[str] = None, status: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None):
-    """Applies RBAC, ro_code, status, and date filters."""
-    query = apply_rbac(query, user)
+def apply_rollup_filters(scope: AccessScope, query, ro_code: Optional[str] = None, status: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """Rollup equivalent of apply_common_filters (dates are whole days)."""
+    query = apply_rbac(scope, query, FeedbackDailyRollup.ro_number)
     
     if ro_code:
-        query = query.where(Feedback.ro_number == ro_code)
+        query = query.where(FeedbackDailyRollup.ro_number == ro_code)
     if status:
-        query = query.where(Feedback.status == status)
-    
-    query = apply_date_filter(query, start_date, end_date)
+        query = query.where(FeedbackDailyRollup.status == status)
+    if start_date:
+        query = query.where(FeedbackDailyRollup.day >= start_date)
+    if end_date:
+        query = query.where(FeedbackDailyRollup.day <= end_date)
     return query
 
+async def rollup_rating_distribution(session: AsyncSession, scope: AccessScope, rating_column, start_date: Optional[date], end_date: Optional[date]):
+    """[(rating, count)] for one rating column, read from the rollup (cached)."""
+    key = dashboard_cache_key(scope, rating_column.key, startDate=start_date, endDate=end_date)
+    cached = dashboard_cache.get(key)
+    if cached is not None:
+        return cached
+
+    stmt = select(rating_column, func.sum(FeedbackDailyRollup.count))
+    stmt = apply_rollup_filters(scope, stmt, start_date=start_date, end_date=end_date)
+    stmt = stmt.where(rating_column != None).group_by(rating_column).order_by(rating_column)
+    results = [(r[0], int(r[1])) for r in (await session.exec(stmt)).all()]
+    dashboard_cache.set(key, results)
+    return results
+
 def process_rating_distribution(results, total):
     rating_map = {1: 'Poor', 2: 'Neutral', 3: 'Good', 4: 'Good', 5: 'Good'}
     aggregated = {'Good': 0, 'Neutral': 0, 'Poor': 0}
@@ -85,23 +94,8 @@ def verify_feedback_access(session: Session, feedback: Feedback, user: AdminUser
     Verifies if the user has access to the specific feedback item.
     Returns True if accessible, False otherwise.
     """
-    if user.role == "superuser" or user.role == "Vendor":
-        return True
-    elif user.role == "DO":
-        # Check if feedback belongs to DO's city
-        stmt = select(AdminUser).where(AdminUser.branch_code == feedback.ro_number, AdminUser.role == "RO")
-        ro_user = session.exec(stmt).first()
-        if ro_user and ro_user.city == user.city:
-            return True
-    elif user.role == "RO":
-        if feedback.ro_number == user.branch_code:
-             return True
-    elif user.role == "FO":
-        # Check mapping
-        mapping = session.exec(select(FOMapping).where(FOMapping.fo_username == user.username, FOMapping.ro_code == feedback.ro_number)).first()
-        if mapping:
-            return True
-    return False
+    # DO: ROs in the DO's city, RO: own branch, FO: FOMapping codes (resolved once per user)
+    return get_access_scope(session, user).can_view(feedback.ro_number)
 
 # --- Dashboard APIs ---
 
@@ -111,25 +105,32 @@ async def get_dashboard_stats(
     status: Optional[str] = None,
     startDate: Optional[date] = None,
     endDate: Optional[date] = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    # Optimize with aggregate query
+    scope = await get_access_scope_async(session, current_user)
+    key = dashboard_cache_key(scope, "stats", roCode=roCode, status=status, startDate=startDate, endDate=endDate)
+    cached = dashboard_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Aggregate over the daily rollup instead of raw feedback rows
+    R = FeedbackDailyRollup
     stmt = select(
-        func.count(Feedback.id),
-        func.sum(case((Feedback.status == "Verified", 1), else_=0)),
-        func.sum(case((Feedback.status == "Not Verified", 1), else_=0)),
-        func.sum(case((Feedback.status.in_(["Pending", "pending"]), 1), else_=0)),
-        func.sum(case((Feedback.status == "Reviewed", 1), else_=0)),
+        func.sum(R.count),
+        func.sum(case((R.status == "Verified", R.count), else_=0)),
+        func.sum(case((R.status == "Not Verified", R.count), else_=0)),
+        func.sum(case((R.status.in_(["Pending", "pending"]), R.count), else_=0)),
+        func.sum(case((R.status == "Reviewed", R.count), else_=0)),
     )
     
-    stmt = apply_common_filters(stmt, current_user, roCode, status, startDate, endDate)
+    stmt = apply_rollup_filters(scope, stmt, roCode, status, startDate, endDate)
 
-    result = session.exec(stmt).first()
+    result = (await session.exec(stmt)).first()
     
     def safe_int(val): return int(val) if val else 0
 
-    return {
+    response = {
         "success": True,
         "data": {
             "totalFeedbacks": safe_int(result[0]),
@@ -140,12 +141,14 @@ async def get_dashboard_stats(
             "lastUpdated": datetime.utcnow()
         }
     }
+    dashboard_cache.set(key, response)
+    return response
 
 @router.get("/dashboard/daily-complaints", response_model=dict)
 async def get_daily_complaints(
     startDate: Optional[date] = None,
     endDate: Optional[date] = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
     print(f"DEBUG: Daily Complaints - User: {current_user.username} ({current_user.role}), Branch: {current_user.branch_code}")
@@ -153,26 +156,33 @@ async def get_daily_complaints(
     start = startDate if startDate else (datetime.utcnow() - timedelta(days=30)).date()
     end = endDate if endDate else datetime.utcnow().date()
 
+    scope = await get_access_scope_async(session, current_user)
+    key = dashboard_cache_key(scope, "daily", startDate=start, endDate=end)
+    cached = dashboard_cache.get(key)
+    if cached is not None:
+        return cached
+
     stmt = select(
-        func.date(Feedback.created_at).label("date"),
-        func.count(Feedback.id).label("count")
+        FeedbackDailyRollup.day.label("date"),
+        func.sum(FeedbackDailyRollup.count).label("count")
     )
     
-    stmt = apply_rbac(stmt, current_user)
-    stmt = apply_date_filter(stmt, start, end)
+    stmt = apply_rollup_filters(scope, stmt, start_date=start, end_date=end)
         
-    stmt = stmt.group_by(func.date(Feedback.created_at)).order_by("date")
+    stmt = stmt.group_by(FeedbackDailyRollup.day).order_by(FeedbackDailyRollup.day)
 
-    results = session.exec(stmt).all()
-    data = [{"date": str(r.date), "count": r.count} for r in results]
+    results = (await session.exec(stmt)).all()
+    data = [{"date": str(r[0]), "count": int(r[1])} for r in results]
     
-    return {"success": True, "data": data}
+    response = {"success": True, "data": data}
+    dashboard_cache.set(key, response)
+    return response
 
 @router.get("/dashboard/not-verified-distribution", response_model=dict)
 async def get_not_verified_distribution(
     startDate: Optional[date] = None,
     endDate: Optional[date] = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
     print(f"DEBUG: Not Verified Dist - User: {current_user.username} ({current_user.role}), Branch: {current_user.branch_code}")
@@ -184,39 +194,37 @@ async def get_not_verified_distribution(
          start = startDate
          end = endDate
 
+    scope = await get_access_scope_async(session, current_user)
+    key = dashboard_cache_key(scope, "not-verified", startDate=start, endDate=end)
+    cached = dashboard_cache.get(key)
+    if cached is not None:
+        return cached
+
     stmt = select(
-        func.date(Feedback.created_at).label("date"),
-        func.count(Feedback.id).label("count")
+        FeedbackDailyRollup.day.label("date"),
+        func.sum(FeedbackDailyRollup.count).label("count")
     )
     
-    stmt = apply_rbac(stmt, current_user)
-    stmt = stmt.where(Feedback.status == "Not Verified")
-    stmt = apply_date_filter(stmt, start, end)
+    stmt = apply_rollup_filters(scope, stmt, status="Not Verified", start_date=start, end_date=end)
 
-    stmt = stmt.group_by(func.date(Feedback.created_at)).order_by("date")
+    stmt = stmt.group_by(FeedbackDailyRollup.day).order_by(FeedbackDailyRollup.day)
 
-    results = session.exec(stmt).all()
-    data = [{"date": str(r.date), "count": r.count} for r in results]
-    return {"success": True, "data": data}
+    results = (await session.exec(stmt)).all()
+    data = [{"date": str(r[0]), "count": int(r[1])} for r in results]
+    response = {"success": True, "data": data}
+    dashboard_cache.set(key, response)
+    return response
 
 @router.get("/dashboard/washroom-feedback", response_model=dict)
 async def get_washroom_feedback(
     startDate: Optional[date] = None,
     endDate: Optional[date] = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
     print(f"DEBUG: Washroom Feedback - User: {current_user.username} ({current_user.role}), Branch: {current_user.branch_code}")
-    stmt = select(Feedback.rating_washroom, func.count(Feedback.id))
-    
-    stmt = apply_rbac(stmt, current_user)
-    stmt = apply_date_filter(stmt, startDate, endDate)
-        
-    stmt = stmt.where(
-        Feedback.rating_washroom != None
-    ).group_by(Feedback.rating_washroom).order_by(Feedback.rating_washroom)
-    
-    results = session.exec(stmt).all()
+    scope = await get_access_scope_async(session, current_user)
+    results = await rollup_rating_distribution(session, scope, FeedbackDailyRollup.rating_washroom, startDate, endDate)
     total = sum(r[1] for r in results)
     
     data = process_rating_distribution(results, total)
@@ -227,20 +235,12 @@ async def get_washroom_feedback(
 async def get_free_air_feedback(
     startDate: Optional[date] = None,
     endDate: Optional[date] = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
     print(f"DEBUG: Free Air Feedback - User: {current_user.username} ({current_user.role}), Branch: {current_user.branch_code}")
-    stmt = select(Feedback.rating_air, func.count(Feedback.id))
-    
-    stmt = apply_rbac(stmt, current_user)
-    stmt = apply_date_filter(stmt, startDate, endDate)
-
-    stmt = stmt.where(
-        Feedback.rating_air != None
-    ).group_by(Feedback.rating_air).order_by(Feedback.rating_air)
-    
-    results = session.exec(stmt).all()
+    scope = await get_access_scope_async(session, current_user)
+    results = await rollup_rating_distribution(session, scope, FeedbackDailyRollup.rating_air, startDate, endDate)
     total = sum(r[1] for r in results)
     
     data = process_rating_distribution(results, total)
@@ -251,26 +251,125 @@ async def get_free_air_feedback(
 async def get_drinking_water_feedback(
     startDate: Optional[date] = None,
     endDate: Optional[date] = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
     print(f"DEBUG: Drinking Water Feedback - User: {current_user.username} ({current_user.role}), Branch: {current_user.branch_code}")
-    stmt = select(Feedback.rating_water, func.count(Feedback.id))
-    
-    stmt = apply_rbac(stmt, current_user)
-    stmt = apply_date_filter(stmt, startDate, endDate)
-
-    stmt = stmt.where(
-        Feedback.rating_water != None
-    ).group_by(Feedback.rating_water).order_by(Feedback.rating_water)
-    
-    results = session.exec(stmt).all()
+    scope = await get_access_scope_async(session, current_user)
+    results = await rollup_rating_distribution(session, scope, FeedbackDailyRollup.rating_water, startDate, endDate)
     total = sum(r[1] for r in results)
     
     data = process_rating_distribution(results, total)
 
     return {"success": True, "data": data, "total": total}
 
+@router.get("/dashboard/summary", response_model=dict)
+async def get_dashboard_summary(
+    roCode: Optional[str] = None,
+    status: Optional[str] = None,
+    startDate: Optional[date] = None,
+    endDate: Optional[date] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AdminUser = Depends(get_current_admin)
+):
+    """
+    Stats, daily trend, not-verified trend and the three rating distributions in
+    one response. All widgets come from a single grouped query over the
+    RBAC-filtered rollup and are split out in Python.
+    Each widget matches its individual endpoint for the same user: roCode and
+    status only narrow the stats (/dashboard is the only one accepting them),
+    and each trend applies its own endpoint's 30-day defaults.
+    """
+    scope = await get_access_scope_async(session, current_user)
+    key = dashboard_cache_key(scope, "summary", roCode=roCode, status=status, startDate=startDate, endDate=endDate, today=datetime.utcnow().date())
+    cached = dashboard_cache.get(key)
+    if cached is not None:
+        return cached
+
+    R = FeedbackDailyRollup
+    scoped = apply_rollup_filters(scope, select(R), None, None, startDate, endDate).cte("scoped_rollup")
+    # roCode only applies to the stats, so rows are tagged rather than filtered
+    in_ro = (scoped.c.ro_number == roCode) if roCode else literal(True)
+    stmt = select(
+        scoped.c.day, scoped.c.status,
+        scoped.c.rating_air, scoped.c.rating_washroom, scoped.c.rating_water,
+        in_ro, func.sum(scoped.c.count),
+    ).group_by(
+        scoped.c.day, scoped.c.status,
+        scoped.c.rating_air, scoped.c.rating_washroom, scoped.c.rating_water,
+        in_ro,
+    )
+    rows = (await session.exec(stmt)).all()
+
+    # Same windows as /dashboard/daily-complaints and /dashboard/not-verified-distribution
+    today = datetime.utcnow().date()
+    default_start = (datetime.utcnow() - timedelta(days=30)).date()
+    daily_window = (startDate or default_start, endDate or today)
+    if not startDate and not endDate:
+        not_verified_window = (default_start, today)
+    else:
+        not_verified_window = (startDate, endDate)
+
+    def in_window(day, window):
+        start, end = window
+        return (not start or day >= start) and (not end or day <= end)
+
+    stats = {"total": 0, "Verified": 0, "Not Verified": 0, "Pending": 0, "Reviewed": 0}
+    daily = {}
+    not_verified = {}
+    ratings = {"air": {}, "washroom": {}, "water": {}}
+
+    for day, row_status, rating_air, rating_washroom, rating_water, row_in_ro, count in rows:
+        count = int(count or 0)
+        if not count:
+            continue
+
+        if row_in_ro and (not status or row_status == status):
+            stats["total"] += count
+            bucket = "Pending" if row_status in ("Pending", "pending") else row_status
+            if bucket in stats:
+                stats[bucket] += count
+
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        if in_window(day, daily_window):
+            daily[day] = daily.get(day, 0) + count
+        if row_status == "Not Verified" and in_window(day, not_verified_window):
+            not_verified[day] = not_verified.get(day, 0) + count
+
+        for kind, rating in (("air", rating_air), ("washroom", rating_washroom), ("water", rating_water)):
+            if rating is not None:
+                ratings[kind][rating] = ratings[kind].get(rating, 0) + count
+
+    def trend(points):
+        return [{"date": str(d), "count": points[d]} for d in sorted(points)]
+
+    def distribution(kind):
+        results = sorted(ratings[kind].items())
+        total = sum(c for _, c in results)
+        return {"data": process_rating_distribution(results, total), "total": total}
+
+    response = {
+        "success": True,
+        "data": {
+            "stats": {
+                "totalFeedbacks": stats["total"],
+                "verifiedFeedbacks": stats["Verified"],
+                "notVerifiedFeedbacks": stats["Not Verified"],
+                "pendingFeedbacks": stats["Pending"],
+                "reviewedFeedbacks": stats["Reviewed"],
+                "lastUpdated": datetime.utcnow()
+            },
+            "dailyComplaints": trend(daily),
+            "notVerifiedDistribution": trend(not_verified),
+            "washroomFeedback": distribution("washroom"),
+            "freeAirFeedback": distribution("air"),
+            "drinkingWaterFeedback": distribution("water"),
+        }
+    }
+    dashboard_cache.set(key, response)
+    return response
+
 # --- Feedback Management APIs ---
 
 @router.get("/feedbacks", response_model=dict)
@@ -289,11 +388,14 @@ async def get_feedbacks(
     hasReceipt: Optional[bool] = None,
     hasImages: Optional[bool] = None,
     useAsTestimonial: Optional[bool] = None,
-    session: Session = Depends(get_session),
+    cursor: Optional[str] = None, # nextCursor from the previous page; replaces page
+    countMode: str = "exact", # exact, estimated or none
+    session: AsyncSession = Depends(get_async_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    query = select(Feedback)
-    
+    if countMode not in ("exact", "estimated", "none"):
+        raise HTTPException(status_code=400, detail="countMode must be one of: exact, estimated, none")
+
     dt_start = None
     dt_end = None
     
@@ -305,49 +407,72 @@ async def get_feedbacks(
         if 'T' not in endDate:
              dt_end = dt_end + timedelta(days=1) - timedelta(seconds=1)
 
-    query = apply_common_filters(query, current_user, roCode, status, dt_start, dt_end)
-    
-    if freeAirRating:
-        query = query.where(Feedback.rating_air == freeAirRating)
-    if washroomRating:
-        query = query.where(Feedback.rating_washroom == washroomRating)
-    if useAsTestimonial is not None:
-        query = query.where(Feedback.is_testimonial == useAsTestimonial)
-    
-    if search:
-        query = query.where(
-            (Feedback.phone.contains(search)) | 
-            (Feedback.comment.contains(search))
-        )
+    scope = await get_access_scope_async(session, current_user)
+
+    def apply_filters(query):
+        query = apply_common_filters(scope, query, roCode, status, dt_start, dt_end)
         
-    if hasReceipt:
-        query = query.where(Feedback.photo_receipt != None)
-    elif hasReceipt is False:
-        query = query.where(Feedback.photo_receipt == None)
-
-    if hasImages:
-        query = query.where((Feedback.photo_air != None) | (Feedback.photo_washroom != None))
-    elif hasImages is False:
-        query = query.where((Feedback.photo_air == None) & (Feedback.photo_washroom == None))
+        if freeAirRating:
+            query = query.where(Feedback.rating_air == freeAirRating)
+        if washroomRating:
+            query = query.where(Feedback.rating_washroom == washroomRating)
+        if useAsTestimonial is not None:
+            query = query.where(Feedback.is_testimonial == useAsTestimonial)
         
-    count_stmt = select(func.count()).select_from(query.subquery())
-    total = session.exec(count_stmt).one()
+        if search:
+            query = query.where(
+                (Feedback.phone.contains(search)) | 
+                (Feedback.comment.contains(search))
+            )
+            
+        if hasReceipt:
+            query = query.where(photo_exists_clause("receipt"))
+        elif hasReceipt is False:
+            query = query.where(~photo_exists_clause("receipt"))
+
+        if hasImages:
+            query = query.where(photo_exists_clause("air") | photo_exists_clause("washroom"))
+        elif hasImages is False:
+            query = query.where(~photo_exists_clause("air") & ~photo_exists_clause("washroom"))
+        return query
 
-    if hasattr(Feedback, sortBy):
-        col_attr = getattr(Feedback, sortBy)
+    total = None
+    if countMode == "exact":
+        total = (await session.exec(apply_filters(select(func.count(Feedback.id))))).one()
+    elif countMode == "estimated":
+        total = await session.run_sync(estimate_count, apply_filters(select(Feedback.id)))
+
+    query = apply_filters(select_feedbacks_with_photo_flags())
+
+    # Keyset pagination is keyed on (sort column, id) and needs a non-nullable sort column
+    sort_field = sortBy if hasattr(Feedback, sortBy) else "created_at"
+    keyset = sort_field in KEYSET_SORT_FIELDS
+    if cursor and not keyset:
+        raise HTTPException(status_code=400, detail=f"Cursor pagination is not supported when sorting by {sortBy}")
+
+    if keyset:
+        try:
+            query = apply_keyset(query, getattr(Feedback, sort_field), cursor, descending=sortOrder == 'desc')
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        col_attr = getattr(Feedback, sort_field)
         if sortOrder == 'desc':
             query = query.order_by(col_attr.desc())
         else:
             query = query.order_by(col_attr.asc())
-    else:
-        query = query.order_by(Feedback.created_at.desc())
-        
-    query = query.offset((page - 1) * limit).limit(limit)
-    
-    feedbacks = session.exec(query).all()
+
+    if not cursor:
+        query = query.offset((page - 1) * limit)
+    # Fetch one extra row to know whether there is a next page
+    rows = (await session.exec(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
     feedback_dtos = []
-    for f in feedbacks:
+    for row in rows:
+        f = row[0]
+        has_photo = photo_flags(row)
         dto = {
             "id": f.id,
             "createdAt": f.created_at,
@@ -363,10 +488,10 @@ async def get_feedbacks(
             "reviewedAt": f.reviewed_at,
             "reviewedBy": f.reviewed_by,
             "roCode": f.ro_number,
-            "freeAirFacilityImage": f.id if f.photo_air else None,
-            "drinkingWaterImage": f.id if f.photo_water else None,
-            "washroomCleanlinessImage": f.id if f.photo_washroom else None,
-            "fuelTransactionReceipt": f.id if f.photo_receipt else None,
+            "freeAirFacilityImage": f.id if has_photo["air"] else None,
+            "drinkingWaterImage": f.id if has_photo["water"] else None,
+            "washroomCleanlinessImage": f.id if has_photo["washroom"] else None,
+            "fuelTransactionReceipt": f.id if has_photo["receipt"] else None,
             "workflowStatus": f.workflow_status,
             "assignedFoId": f.assigned_fo_id,
         }
@@ -377,9 +502,11 @@ async def get_feedbacks(
         "data": feedback_dtos,
         "pagination": {
             "total": total,
+            "totalIsEstimate": countMode == "estimated",
             "page": page,
             "limit": limit,
-            "totalPages": (total + limit - 1) // limit
+            "totalPages": (total + limit - 1) // limit if total is not None else None,
+            "nextCursor": next_cursor(rows[-1][0], sort_field) if keyset and has_more else None
         }
     }
 
@@ -389,16 +516,21 @@ async def get_feedback_detail(
     session: Session = Depends(get_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, id)
-    if not feedback:
+    row = session.exec(select_feedbacks_with_photo_flags().where(Feedback.id == id)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Feedback not found")
+    feedback = row[0]
         
     if not verify_feedback_access(session, feedback, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to access this feedback")
 
+    data = feedback_to_dict(feedback)
+    for kind, present in photo_flags(row).items():
+        data[f"has_photo_{kind}"] = present
+
     return {
         "success": True,
-        "data": feedback 
+        "data": data
     }
 
 @router.patch("/feedbacks/{id}/review", response_model=dict)
@@ -408,7 +540,7 @@ async def review_feedback(
     session: Session = Depends(get_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, id)
+    feedback = get_feedback(session, id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
         
@@ -416,6 +548,7 @@ async def review_feedback(
         raise HTTPException(status_code=403, detail="Not authorized to review this feedback")
 
     old_status = feedback.status
+    before = rollup_key(feedback)
     
     feedback.status = payload.get("status", "Reviewed")
     feedback.reviewed = True
@@ -423,8 +556,10 @@ async def review_feedback(
     feedback.reviewed_by_id = current_user.id
     feedback.reviewed_at = datetime.utcnow()
     
+    record_feedback_change(session, before, rollup_key(feedback))
     session.add(feedback)
     session.commit()
+    dashboard_cache.invalidate()
     session.refresh(feedback)
     
     history = ReviewHistory(
@@ -457,20 +592,23 @@ async def update_workflow_status(
     session: Session = Depends(get_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    feedback = session.get(Feedback, id)
+    feedback = get_feedback(session, id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
 
     new_status = payload.status
     old_status = feedback.workflow_status
+    before = rollup_key(feedback)
     
     # Global Reject Handler
     if new_status == "Rejected":
          if current_user.role in ["Vendor", "superuser", "DO"]:
               feedback.workflow_status = "Rejected"
               feedback.status = "Rejected"
+              record_feedback_change(session, before, rollup_key(feedback))
               session.add(feedback)
               session.commit()
+              dashboard_cache.invalidate()
               session.refresh(feedback)
               return {"success": True, "message": "Feedback Rejected"}
          else:
@@ -550,8 +688,10 @@ async def update_workflow_status(
         # RO or others?
         raise HTTPException(status_code=403, detail="Unauthorized role for this workflow.")
 
+    record_feedback_change(session, before, rollup_key(feedback))
     session.add(feedback)
     session.commit()
+    dashboard_cache.invalidate()
     session.refresh(feedback)
     
     return {"success": True, "message": f"Status updated to {feedback.workflow_status}"}
@@ -576,23 +716,20 @@ async def get_filter_options(
     session: Session = Depends(get_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    query = select(Branch)
+    results = branch_registry.all(session)
     
     if current_user.role == "DO":
-        if current_user.city:
-            query = query.where(Branch.city == current_user.city)
-        else:
-            query = query.where(Branch.city == "NON_EXISTENT_CITY")
+        # A DO without a city sees no branches
+        results = [b for b in results if current_user.city and b.city == current_user.city]
             
     elif current_user.role == "RO":
-        query = query.where(Branch.ro_code == current_user.branch_code)
+        results = [b for b in results if b.ro_code == current_user.branch_code]
         
     elif current_user.role == "FO":
-        # FO Manages multiple ROs via FOMapping
-        sub = select(FOMapping.ro_code).where(FOMapping.fo_username == current_user.username)
-        query = query.where(Branch.ro_code.in_(sub))
+        # FO Manages multiple ROs via FOMapping (resolved in the user's cached scope)
+        fo_codes = get_access_scope(session, current_user).detail_ro_codes
+        results = [b for b in results if b.ro_code in fo_codes]
         
-    results = session.exec(query).all()
     statuses = ["Pending", "Vendor Verified", "Assigned", "Action Taken", "Resolved", "Rejected"]
     
     ro_options = []
@@ -613,7 +750,7 @@ async def get_filter_options(
         }
     }
 
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse
 
 @router.get("/feedbacks/export/csv")
 async def export_csv(
@@ -627,66 +764,104 @@ async def export_csv(
     session: Session = Depends(get_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    query = select(Feedback)
-    
-    dt_start = None
-    dt_end = None
-    # Fix robust date parsing
     try:
-        if startDate:
-            # Handle YYYY-MM-DD or ISO
-            clean_date = startDate.split('T')[0]
-            dt_start = datetime.strptime(clean_date, "%Y-%m-%d")
-        
-        if endDate:
-            clean_date = endDate.split('T')[0]
-            dt_end = datetime.strptime(clean_date, "%Y-%m-%d")
-            # Set to end of day
-            dt_end = dt_end.replace(hour=23, minute=59, second=59)
+        dt_start, dt_end = parse_export_dates(startDate, endDate)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
-    query = apply_common_filters(query, current_user, roCode, status, dt_start, dt_end)
-        
-    query = query.order_by(Feedback.created_at.desc())
-    feedbacks = session.exec(query).all()
-    
-    def adjust_time(dt_utc):
-        if not dt_utc: return ""
-        # Adjust UTC to Target Timezone
-        # timezone_offset is in minutes to ADD
-        # e.g. IST is +5:30 -> +330 minutes
-        adjusted = dt_utc + timedelta(minutes=timezone_offset)
-        return adjusted.strftime('%Y-%m-%d %H:%M')
-
-    def iter_csv(data):
+    scope = get_access_scope(session, current_user)
+    # Only the exported columns; rows are streamed, never loaded as Feedback objects
+    query = export_query(scope, roCode, status, dt_start, dt_end)
+
+    def iter_csv(query):
         output = io.StringIO()
         writer = csv.writer(output)
         
-        # Add 'Drinking Water Rating' to header
-        writer.writerow(['ID', 'Date', 'Phone Number', 'RO Code', 'Free Air Rating', 'Washroom Rating', 'Drinking Water Rating', 'Comments', 'Status', 'Reviewed By'])
+        writer.writerow(EXPORT_HEADER)
         yield output.getvalue()
         output.seek(0)
         output.truncate(0)
         
-        for f in data:
-            writer.writerow([
-                f.id,
-                adjust_time(f.created_at), # Dynamic Time
-                f.phone,
-                f.ro_number or 'N/A',
-                f.rating_air,
-                f.rating_washroom,
-                f.rating_water, # Added Water Rating
-                f.comment or '',
-                f.status,
-                f.reviewed_by or 'N/A'
-            ])
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
+        # The request session is closed once the response starts, so the
+        # stream owns its own session; it runs in the threadpool
+        with Session(engine) as stream_session:
+            result = stream_session.exec(query)
+            for chunk in result.partitions():
+                for f in chunk:
+                    writer.writerow(export_row(f, timezone_offset))
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
 
     filename_date = datetime.now().strftime('%Y%m%d%H%M%S')
-    response = StreamingResponse(iter_csv(feedbacks), media_type="text/csv")
+    response = StreamingResponse(iter_csv(query), media_type="text/csv")
     response.headers["Content-Disposition"] = f"attachment; filename=feedbacks_{filename_date}.csv"
     return response
+
+# --- Export Jobs ---
+
+def export_job_to_dict(job) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "format": job.format,
+        "rowCount": job.row_count,
+        "error": job.error,
+        "createdAt": job.created_at,
+        "startedAt": job.started_at,
+        "finishedAt": job.finished_at,
+        "downloadUrl": f"/api/feedbacks/export/jobs/{job.id}/download" if job.status == "done" else None,
+    }
+
+def get_export_job_for_user(session: Session, job_id: str, user: AdminUser):
+    job = session.get(ExportJob, job_id)
+    # Jobs the user may not see are reported as missing
+    if not job or not can_access_job(job, user, get_access_scope(session, user)):
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@router.post("/feedbacks/export/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    request: ExportJobRequest,
+    session: Session = Depends(get_session),
+    current_user: AdminUser = Depends(get_current_admin)
+):
+    """Queues a background export (or joins an identical one already in progress). Poll the job, then download it."""
+    try:
+        parse_export_dates(request.startDate, request.endDate)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
+
+    scope = get_access_scope(session, current_user)
+    job = submit_export_job(
+        session, current_user, scope, request.format,
+        ro_code=request.roCode, status=request.status,
+        start_date=request.startDate, end_date=request.endDate,
+        timezone_offset=request.timezone_offset,
+    )
+    return {"success": True, "data": export_job_to_dict(job)}
+
+@router.get("/feedbacks/export/jobs/{job_id}")
+async def get_export_job(
+    job_id: str,
+    session: Session = Depends(get_session),
+    current_user: AdminUser = Depends(get_current_admin)
+):
+    job = get_export_job_for_user(session, job_id, current_user)
+    return {"success": True, "data": export_job_to_dict(job)}
+
+@router.get("/feedbacks/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    session: Session = Depends(get_session),
+    current_user: AdminUser = Depends(get_current_admin)
+):
+    job = get_export_job_for_user(session, job_id, current_user)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+
+    suffix, media_type = EXPORT_FORMATS[job.format]
+    filename = f"feedbacks_{job.created_at.strftime('%Y%m%d%H%M%S')}{suffix}"
+    return FileResponse(job.file_path, media_type=media_type, filename=filename)
@@ -6,9 +6,9 @@ from typing import Any
 
 from core.database import get_session
 from models import AdminUser
-from services.auth_service import get_current_admin
+from services.auth_service import get_current_admin, invalidate_principal
 from core.config import settings
-from core.security import verify_password, create_access_token, get_password_hash
+from core.security import verify_password_async, create_access_token, get_password_hash_async
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
@@ -40,8 +40,11 @@ async def login_json(
     session: Session = Depends(get_session)
 ):
     user = session.exec(select(AdminUser).where(AdminUser.username == login_data.username)).first()
+    # Give the connection back to the pool while the hash is checked; `user`
+    # stays loaded and is re-attached by session.add() below
+    session.close()
     
-    if not user or not verify_password(login_data.password, user.password_hash):
+    if not user or not await verify_password_async(login_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -106,11 +109,13 @@ async def change_password(
     session: Session = Depends(get_session),
     current_user: AdminUser = Depends(get_current_admin)
 ):
-    if not verify_password(payload.currentPassword, current_user.password_hash):
+    user = session.get(AdminUser, current_user.id)
+    if not user or not await verify_password_async(payload.currentPassword, user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
-    current_user.password_hash = get_password_hash(payload.newPassword)
-    session.add(current_user)
+    user.password_hash = await get_password_hash_async(payload.newPassword)
+    session.add(user)
     session.commit()
+    invalidate_principal(user.username)
     
     return {"success": True, "message": "Password changed successfully"}
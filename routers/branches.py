@@ -7,6 +7,7 @@ from core.database import get_session
 from models_refactor import Branch
 from models import AdminUser
 from services.auth_service import get_current_admin
+from services.branch_registry import branch_registry
 
 router = APIRouter(prefix="/api/branches", tags=["branches"])
 
@@ -50,6 +51,7 @@ async def create_branch(
     session.add(branch)
     session.commit()
     session.refresh(branch)
+    branch_registry.put(branch)
     
     return {"success": True, "message": "Branch created successfully", "data": branch}
 
@@ -65,5 +67,6 @@ async def delete_branch(
         
     session.delete(branch)
     session.commit()
+    branch_registry.remove(ro_code)
     
     return {"success": True, "message": "Branch deleted successfully"}
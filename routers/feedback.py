@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks, Request
+import asyncio
+import os
 import uuid
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Optional
-from core.database import get_session
+from core.database import get_session, get_async_session
 from models import Feedback
-from services.whatsapp_client import send_whatsapp_message # Import utility
-from services.tasks import send_immediate_negative_report
+from services import outbox
+from services.negative_alerts import is_negative, queue_negative_alert
+from services.media_store import PHOTO_KINDS, get_media_store, record_feedback_photo, get_photo_source, detect_content_type
+from services.feedback_query import get_feedback
+from services.media_ingest import process_uploaded_media
+from services.rollup import rollup_key, record_feedback_change
+from services.cache import dashboard_cache
 from core.config import settings
+from core.http_cache import make_etag, blob_response
 
 router = APIRouter(prefix="/feedback", tags=["feedback"])
 
@@ -15,7 +25,7 @@ from core.logger import get_logger
 logger = get_logger(__name__)
 
 from models import FeedbackRead
-from models_refactor import Branch
+from services.branch_registry import branch_registry
 
 @router.post("/", response_model=FeedbackRead)
 async def submit_feedback(
@@ -33,7 +43,7 @@ async def submit_feedback(
     photo_receipt: Optional[UploadFile] = File(None),
     ro_number: Optional[str] = Form(None),
     source_id: Optional[str] = Form(None), # Backward compatibility
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         # Validation: Terms and Conditions
@@ -53,47 +63,51 @@ async def submit_feedback(
         MAX_FILE_SIZE = 5 * 1024 * 1024 # 5MB
 
         async def read_and_validate(file: UploadFile | None):
+            """
+            Validates an upload without reading it into memory: the multipart
+            parser has already spooled it (to disk above 1 MB). Returns its
+            content type and leaves the file at offset 0 for streaming.
+            """
             if not file:
                 return None
             
-            # 1. DoS Protection: Read only up to MAX + 1 bytes
-            content = await file.read(MAX_FILE_SIZE + 1)
-            if len(content) > MAX_FILE_SIZE:
-                raise HTTPException(status_code=413, detail=f"File {file.filename} exceeds 5MB limit")
-            
-            # 2. Key Magic Bytes Check (Security)
+            # 1. Key Magic Bytes Check (Security), from the first chunk only
             # JPEG: FF D8 FF
             # PNG: 89 50 4E 47
             # PDF: 25 50 44 46 (%PDF)
-            
-            thumb = content[:4]
+            thumb = await file.read(4)
             is_valid = False
             if thumb.startswith(b'\xff\xd8\xff'): is_valid = True # JPEG
             elif thumb.startswith(b'\x89PNG'): is_valid = True # PNG
             elif thumb.startswith(b'%PDF'): is_valid = True # PDF
             
             if not is_valid:
-                 # Fallback: Trust content type ONLY if magic check fails? 
-                 # Or strict mode? Let's be strict for security as requested.
-                 # But valid simple text files or others shouldn't be here.
-                 # User uploaded image/pdf.
-                 # Let's log warning and reject.
                  logger.warning(f"Invalid file signature for {file.filename}. Header: {thumb.hex()}")
                  raise HTTPException(status_code=415, detail="Invalid file type. Only JPG, PNG, and PDF allowed.")
 
-            return content
+            # 2. DoS Protection: size of the spooled file, never a full read
+            size = file.size if file.size is not None else file.file.seek(0, os.SEEK_END)
+            if size > MAX_FILE_SIZE:
+                raise HTTPException(status_code=413, detail=f"File {file.filename} exceeds 5MB limit")
 
-        photo_air_bytes = await read_and_validate(photo_air)
-        photo_washroom_bytes = await read_and_validate(photo_washroom)
-        photo_water_bytes = await read_and_validate(photo_water)
-        photo_receipt_bytes = await read_and_validate(photo_receipt)
+            await file.seek(0)
+            return detect_content_type(thumb)
+
+        uploads = {
+            "air": photo_air,
+            "washroom": photo_washroom,
+            "water": photo_water,
+            "receipt": photo_receipt,
+        }
+        content_types = dict(zip(uploads, await asyncio.gather(*(read_and_validate(f) for f in uploads.values()))))
 
         # Resolve Branch Code
         final_ro_code = ro_number or source_id or settings.DEFAULT_RO_NUMBER
         
         # Validation: Branch Code Existence
         if final_ro_code:
-            branch_exists = session.get(Branch, final_ro_code)
+            # Dict lookup in the in-memory registry; only unknown codes reach the DB
+            branch_exists = await branch_registry.get_async(session, final_ro_code)
             if not branch_exists:
                 logger.warning(f"Feedback rejected due to invalid RO Code: {final_ro_code}")
                 raise HTTPException(status_code=400, detail=f"Invalid Branch Code: {final_ro_code}. Feedback rejected.")
@@ -109,24 +123,38 @@ async def submit_feedback(
             ro_number=final_ro_code,
             branch_code=final_ro_code,
             feedback_method="web",
-            session_id=str(uuid.uuid4()),
-            photo_air=photo_air_bytes,
-            photo_washroom=photo_washroom_bytes,
-            photo_water=photo_water_bytes,
-            photo_receipt=photo_receipt_bytes
+            session_id=str(uuid.uuid4())
         )
         session.add(feedback)
-        session.commit()
-        session.refresh(feedback)
-        logger.info(f"New feedback received from {phone}")
-        
-        # Trigger WhatsApp Message
+        await session.flush()
+        # Sync helpers run via run_sync; their queries still go through the async driver
+        await session.run_sync(record_feedback_change, None, rollup_key(feedback))
+
+        # Photos are streamed into the media store (hashing and copying in the
+        # threadpool, concurrently); the feedback row only keeps references
+        kinds = [kind for kind, content_type in content_types.items() if content_type]
+        store = get_media_store()
+        stored = await asyncio.gather(*(run_in_threadpool(store.put_file, uploads[kind].file) for kind in kinds))
+        stored_media = []
+        for kind, (key, size) in zip(kinds, stored):
+            stored_media.append(await session.run_sync(record_feedback_photo, feedback.id, kind, key, size, content_types[kind]))
+
+        # Notifications are queued in the same transaction as the feedback, so
+        # they survive a restart and are retried if WhatsApp/SMTP is down
         message = "Thank you for your feedback! We appreciate your time."
-        background_tasks.add_task(send_whatsapp_message, phone, message)
+        outbox.enqueue(session, "whatsapp_message", {"phone": phone, "message": message})
+        if is_negative(feedback):
+            await session.run_sync(queue_negative_alert, feedback)
+
+        await session.commit()
+        outbox.wake()
+        dashboard_cache.invalidate()
+        await session.refresh(feedback)
+        logger.info(f"New feedback received from {phone}")
 
-        # Trigger Immediate Email if Negative Feedback
-        if rating_air == 1 or rating_washroom == 1 or rating_water == 1:
-            background_tasks.add_task(send_immediate_negative_report, feedback.id)
+        # Normalize the photos and render their thumbnails off the request path
+        if stored_media:
+            background_tasks.add_task(process_uploaded_media, [media.id for media in stored_media])
         
         # Return response without raw bytes
         from models import FeedbackRead
@@ -155,39 +183,23 @@ async def submit_feedback(
         # Secure logging instead of local file write
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-from fastapi.responses import Response
-
 @router.get("/{feedback_id}/image/{image_type}")
 async def get_feedback_image(
+    request: Request,
     feedback_id: int, 
     image_type: str, 
     session: Session = Depends(get_session)
 ):
-    feedback = session.get(Feedback, feedback_id)
+    feedback = get_feedback(session, feedback_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
     
-    image_data = None
-    if image_type == "air":
-        image_data = feedback.photo_air
-    elif image_type == "washroom":
-        image_data = feedback.photo_washroom
-    elif image_type == "water":
-        image_data = feedback.photo_water
-    elif image_type == "receipt":
-        image_data = feedback.photo_receipt
-    else:
+    if image_type not in PHOTO_KINDS:
         raise HTTPException(status_code=400, detail="Invalid image type")
-    
-    if not image_data:
+
+    source = get_photo_source(session, feedback, image_type)
+    if not source:
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    # Detect MIME type from magic bytes
-    mime_type = "image/jpeg"  # default
-    if len(image_data) >= 4:
-        if image_data[:4] == b'\\x89PNG':
-            mime_type = "image/png"
-        elif image_data[:4] == b'%PDF':
-            mime_type = "application/pdf"
-        
-    return Response(content=image_data, media_type=mime_type)
+
+    # The ETag is the content hash: revalidation is a 304 without reading the blob
+    return blob_response(request, make_etag(source.sha256), source.size, source.content_type, source.open)
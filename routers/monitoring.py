@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+
+from core.database import get_session, pool_status
+from models import AdminUser
+from services.auth_service import get_current_admin
+from services.branch_registry import branch_registry
+from services.cache import cache_stats
+from services.outbox import outbox_stats, retry_job, wake
+
+router = APIRouter(prefix="/api/internal", tags=["monitoring"])
+
+def get_superuser(current_user: AdminUser = Depends(get_current_admin)):
+    if current_user.role != "superuser":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return current_user
+
+@router.get("/cache-stats")
+async def get_cache_stats(current_user: AdminUser = Depends(get_superuser)):
+    """Hit/miss counters and sizes of the in-process caches."""
+    return {"success": True, "data": {**cache_stats(), "branchRegistry": branch_registry.stats()}}
+
+@router.get("/pool")
+async def get_pool_status(current_user: AdminUser = Depends(get_superuser)):
+    """Connection pool usage and checkout wait-time histogram (per worker process)."""
+    return {"success": True, "data": pool_status()}
+
+@router.get("/outbox")
+def get_outbox_status(session: Session = Depends(get_session), current_user: AdminUser = Depends(get_superuser)):
+    """Outbox job counts by status and the most recent dead jobs."""
+    return {"success": True, "data": outbox_stats(session)}
+
+@router.post("/outbox/{job_id}/retry")
+def retry_outbox_job(job_id: int, session: Session = Depends(get_session), current_user: AdminUser = Depends(get_superuser)):
+    """Requeues a dead outbox job with a fresh set of attempts."""
+    job = retry_job(session, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Dead outbox job not found")
+    wake()
+    return {"success": True, "data": {"id": job.id, "status": job.status}}
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select
 from typing import List, Optional
 from pydantic import BaseModel
@@ -7,9 +8,11 @@ import uuid
 from core.database import get_session
 from models import AdminUser, FOMapping, UserROMapping
 from models_refactor import Branch
-from services.auth_service import get_current_admin
+from services.auth_service import get_current_admin, invalidate_principal
 from services.user_onboarding import process_ro_excel_upload
-from core.security import get_password_hash
+from services.access_scope import invalidate_access_scopes
+from services.branch_registry import branch_registry
+from core.security import get_password_hash_async
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -66,7 +69,8 @@ async def upload_ro_list(
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload Excel.")
     
     contents = await file.read()
-    result = process_ro_excel_upload(contents, session)
+    # Parses the workbook and hashes a default password per new user; keep it off the event loop
+    result = await run_in_threadpool(process_ro_excel_upload, contents, session)
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -187,7 +191,7 @@ async def create_user(
     # Validate Branch Code exists (Skip for Vendor)
     branch_obj = None
     if user_in.role != "Vendor":
-        branch_obj = session.get(Branch, user_in.branchCode)
+        branch_obj = branch_registry.get(session, user_in.branchCode)
         if not branch_obj:
             raise HTTPException(status_code=400, detail=f"Invalid Branch Code: {user_in.branchCode}")
 
@@ -219,7 +223,7 @@ async def create_user(
         id=str(uuid.uuid4()),
         username=user_in.username,
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await get_password_hash_async(user_in.password),
         full_name=user_in.fullName,
         branch_code=branch_obj.ro_code if branch_obj else "GLOBAL", # Vendor gets GLOBAL
         branch_name=branch_obj.name if branch_obj else "Global Vendor",
@@ -231,6 +235,7 @@ async def create_user(
     session.add(new_user)
     session.commit()
     session.refresh(new_user)
+    invalidate_access_scopes()
     
     return {"success": True, "message": "User created successfully", "data": {"id": new_user.id}}
 
@@ -244,6 +249,8 @@ async def update_user(
     user = session.get(AdminUser, id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    # Cached principals are keyed by username; a rename must drop the old entry
+    previous_username = user.username
         
     target_role = user_in.role if user_in.role else user.role
     target_branch_code = user_in.branchCode if user_in.branchCode else user.branch_code
@@ -253,7 +260,7 @@ async def update_user(
          # If Role is Vendor, ignore branch update or set to Global? 
          # Simplification: If Updating TO Vendor, verify singleton.
          
-         branch_obj = session.get(Branch, user_in.branchCode)
+         branch_obj = branch_registry.get(session, user_in.branchCode)
          if not branch_obj and target_role != "Vendor":
              raise HTTPException(status_code=400, detail=f"Invalid Branch Code: {user_in.branchCode}")
          
@@ -303,6 +310,8 @@ async def update_user(
         
     session.add(user)
     session.commit()
+    invalidate_access_scopes()
+    invalidate_principal(previous_username)
     
     return {"success": True, "message": "User updated successfully"}
 
@@ -317,9 +326,10 @@ async def reset_password(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
-    user.password_hash = get_password_hash(payload.newPassword)
+    user.password_hash = await get_password_hash_async(payload.newPassword)
     session.add(user)
     session.commit()
+    invalidate_principal(user.username)
     
     return {"success": True, "message": "Password reset successfully"}
 
@@ -336,7 +346,10 @@ async def delete_user(
     if user.id == superuser.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
         
+    username = user.username
     session.delete(user)
     session.commit()
+    invalidate_access_scopes()
+    invalidate_principal(username)
     
     return {"success": True, "message": "User deleted successfully"}
@@ -5,6 +5,12 @@ import json
 from core.database import get_session
 from models import Feedback, WhatsAppState
 from services.whatsapp_client import send_whatsapp_message, send_interactive_message, download_media
+from services.media_store import save_feedback_photo
+from services.feedback_query import get_feedback
+from services.rollup import rollup_key, record_feedback_change
+from services.cache import dashboard_cache
+from services import outbox
+from services.negative_alerts import is_negative, queue_negative_alert
 from core.config import settings
 from core.logger import get_logger
 
@@ -136,17 +142,18 @@ async def process_whatsapp_message(phone: str, user_input: str, media_id: str, s
                 session_id=phone # Using phone as session_id for WhatsApp
             )
             session.add(feedback)
+            record_feedback_change(session, None, rollup_key(feedback))
             session.commit()
+            dashboard_cache.invalidate()
             session.refresh(feedback)
             temp_data["feedback_id"] = feedback.id
         
-        feedback = session.get(Feedback, temp_data["feedback_id"])
+        feedback = get_feedback(session, temp_data["feedback_id"])
         
         if media_id:
             photo_bytes = await download_media(media_id)
             if photo_bytes:
-                feedback.photo_air = photo_bytes
-                session.add(feedback)
+                save_feedback_photo(session, feedback.id, "air", photo_bytes)
                 session.commit()
                 await send_whatsapp_message(phone, "Photo received! 📸")
         
@@ -165,10 +172,13 @@ async def process_whatsapp_message(phone: str, user_input: str, media_id: str, s
             # Update Feedback
             feedback_id = temp_data.get("feedback_id")
             if feedback_id:
-                feedback = session.get(Feedback, feedback_id)
+                feedback = get_feedback(session, feedback_id)
+                before = rollup_key(feedback)
                 feedback.rating_washroom = rating
+                record_feedback_change(session, before, rollup_key(feedback))
                 session.add(feedback)
                 session.commit()
+                dashboard_cache.invalidate()
             
             await send_whatsapp_message(phone, "Thanks! Would you like to upload a photo of the Washroom? (Send photo or type 'skip')")
             next_state = "PHOTO_WASHROOM"
@@ -180,9 +190,7 @@ async def process_whatsapp_message(phone: str, user_input: str, media_id: str, s
         if feedback_id and media_id:
             photo_bytes = await download_media(media_id)
             if photo_bytes:
-                feedback = session.get(Feedback, feedback_id)
-                feedback.photo_washroom = photo_bytes
-                session.add(feedback)
+                save_feedback_photo(session, feedback_id, "washroom", photo_bytes)
                 session.commit()
                 await send_whatsapp_message(phone, "Photo received! 📸")
 
@@ -192,22 +200,21 @@ async def process_whatsapp_message(phone: str, user_input: str, media_id: str, s
     elif current_state == "COMMENT":
         feedback_id = temp_data.get("feedback_id")
         if feedback_id:
-            feedback = session.get(Feedback, feedback_id)
+            feedback = get_feedback(session, feedback_id)
             if user_input.lower() != "skip":
                 feedback.comment = user_input
             
+            before = rollup_key(feedback)
             feedback.status = "submitted"
             feedback.terms_accepted = True # Implicit via WhatsApp usage
+            record_feedback_change(session, before, rollup_key(feedback))
             session.add(feedback)
+            # Alert (or add to the RO's digest) if negative, committed with the submission
+            if is_negative(feedback):
+                queue_negative_alert(session, feedback)
             session.commit()
-            
-            # Trigger Immediate Report if Negative
-            from services.tasks import send_immediate_negative_report
-            if feedback.rating_air == 1 or feedback.rating_washroom == 1:
-                # We need to run this async, but we are in async function.
-                # However, tasks.py imports might cause circular dependency if not careful.
-                # We did local import above.
-                await send_immediate_negative_report(feedback.id)
+            outbox.wake()
+            dashboard_cache.invalidate()
 
         await send_whatsapp_message(phone, "Thank you for your feedback! Have a great day! 🌟")
         
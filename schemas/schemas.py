@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import BaseModel
 
 # --- Dashboard Schemas ---
@@ -26,3 +26,12 @@ class WorkflowUpdate(BaseModel):
     status: str
     assignedTo: Optional[str] = None
     comments: Optional[str] = None
+
+# --- Export Schemas ---
+class ExportJobRequest(BaseModel):
+    format: Literal["csv", "xlsx"] = "csv" # csv is gzip-compressed
+    roCode: Optional[str] = None
+    status: Optional[str] = None
+    startDate: Optional[str] = None
+    endDate: Optional[str] = None
+    timezone_offset: int = 0 # Minutes to add to UTC (IST = 330)
@@ -0,0 +1,61 @@
+import sys
+import os
+import argparse
+
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, select, or_
+from core.database import engine, create_db_and_tables
+from models import Feedback
+from services.media_store import PHOTO_KINDS, save_feedback_photo
+
+def backfill(batch_size: int, keep_columns: bool):
+    """
+    Moves photo_* blobs from the feedback table into the media store in
+    batches of feedback ids. Safe to re-run: rows already migrated have
+    their columns cleared and are skipped.
+    """
+    create_db_and_tables() # Ensures feedback_media exists
+
+    has_blob = or_(*[getattr(Feedback, f"photo_{kind}") != None for kind in PHOTO_KINDS])
+    last_id = 0
+    migrated_rows = 0
+    migrated_photos = 0
+
+    while True:
+        with Session(engine) as session:
+            # Only ids here; each row's blobs are loaded one at a time below
+            ids = session.exec(
+                select(Feedback.id).where(Feedback.id > last_id, has_blob).order_by(Feedback.id).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+
+            for feedback_id in ids:
+                feedback = session.get(Feedback, feedback_id)
+                for kind in PHOTO_KINDS:
+                    column = f"photo_{kind}"
+                    data = getattr(feedback, column)
+                    if not data:
+                        continue
+                    save_feedback_photo(session, feedback.id, kind, data)
+                    migrated_photos += 1
+                    if not keep_columns:
+                        setattr(feedback, column, None)
+                session.add(feedback)
+                migrated_rows += 1
+
+            session.commit()
+            last_id = ids[-1]
+            print(f"Migrated up to feedback id {last_id} ({migrated_rows} rows, {migrated_photos} photos)")
+
+    print(f"Backfill complete. {migrated_rows} rows, {migrated_photos} photos moved to the media store.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move feedback photos into the media store")
+    parser.add_argument("--batch-size", type=int, default=100, help="Feedback rows per transaction")
+    parser.add_argument("--keep-columns", action="store_true", help="Copy blobs but leave the photo_* columns populated")
+    args = parser.parse_args()
+
+    backfill(args.batch_size, args.keep_columns)
@@ -0,0 +1,102 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.database import engine, get_async_engine, dispose_async_engine
+from models import Feedback, FeedbackDailyRollup
+from services.feedback_query import select_feedbacks_with_photo_flags
+
+# Compares the old "sync Session inside async def" pattern against AsyncSession
+# for the queries behind /api/feedbacks and the dashboard, at a given concurrency.
+# Also samples event-loop lag: with blocking sync calls the loop stalls for the
+# duration of every query, which is what freezes unrelated requests.
+
+def feedback_page_query():
+    return select_feedbacks_with_photo_flags().order_by(Feedback.created_at.desc(), Feedback.id.desc()).limit(10)
+
+def feedback_count_query():
+    return select(func.count(Feedback.id))
+
+def dashboard_query():
+    R = FeedbackDailyRollup
+    return select(R.day, R.status, func.sum(R.count)).group_by(R.day, R.status)
+
+QUERIES = [feedback_page_query, feedback_count_query, dashboard_query]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def loop_lag_monitor(stop, lags, interval=0.005):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def sync_request():
+    # What the routes did before: blocking calls straight on the event loop
+    with Session(engine) as session:
+        for build in QUERIES:
+            session.exec(build()).all()
+
+async def async_request():
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        for build in QUERIES:
+            (await session.exec(build())).all()
+
+async def run_mode(name, request, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - start)
+
+    # Warm up connections
+    await asyncio.gather(*[request() for _ in range(min(concurrency, 5))])
+
+    stop = asyncio.Event()
+    lags = []
+    monitor = asyncio.create_task(loop_lag_monitor(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    ms = [v * 1000 for v in latencies]
+    lag_ms = [v * 1000 for v in lags]
+    print(
+        f"{name:<6} {total / elapsed:8.1f} req/s  "
+        f"p50={percentile(ms, 50):7.1f}ms p99={percentile(ms, 99):7.1f}ms  "
+        f"loop lag p99={percentile(lag_ms, 99):7.1f}ms max={max(lag_ms, default=0):7.1f}ms"
+    )
+
+async def main(args):
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"{args.requests} requests x {len(QUERIES)} queries, concurrency {args.concurrency}")
+    if args.mode in ("sync", "both"):
+        await run_mode("sync", sync_request, args.requests, args.concurrency)
+    if args.mode in ("async", "both"):
+        await run_mode("async", async_request, args.requests, args.concurrency)
+    await dispose_async_engine()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync-in-async vs AsyncSession throughput")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,145 @@
+import sys
+import os
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+# Builds the daily report over N synthetic feedbacks with the old approach
+# (every row and every original photo loaded up front) and with the chunked
+# thumbnail builder, each in its own process so peak RSS is measured cleanly.
+# Uses a scratch SQLite database and media store, never DATABASE_URL.
+
+def configure(workdir):
+    """Points settings at the scratch database/media store. Must run before importing core modules."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["MEDIA_ROOT"] = os.path.join(workdir, "media")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ.setdefault("ADMIN_USERNAME", "bench")
+    os.environ.setdefault("ADMIN_PASSWORD", "bench")
+
+def synthetic_photo(index, width, height):
+    # Noise keeps every photo distinct and phone-camera sized after JPEG encoding
+    from PIL import Image
+    rng = random.Random(index)
+    img = Image.effect_noise((width, height), 40).convert("RGB")
+    tint = Image.new("RGB", (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buf = io.BytesIO()
+    Image.blend(img, tint, 0.5).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+def seed(args):
+    from sqlmodel import Session
+    from core.database import engine, create_db_and_tables
+    from models import Feedback
+    from services.media_store import get_media_store, record_feedback_photo
+    from services.thumbnails import pregenerate_thumbnails
+
+    create_db_and_tables()
+    store = get_media_store()
+    now = datetime.utcnow()
+    rng = random.Random(0)
+    photo_bytes = 0
+    keys = []
+    with Session(engine) as session:
+        for i in range(args.feedbacks):
+            feedback = Feedback(
+                phone=f"9{i:09d}",
+                rating_air=rng.randint(1, 3),
+                rating_washroom=rng.randint(1, 3),
+                rating_water=rng.randint(1, 3),
+                comment=f"Synthetic feedback {i}",
+                terms_accepted=True,
+                ro_number=f"RO{i % 1300:04d}",
+                branch_code=f"RO{i % 1300:04d}",
+                feedback_method="web",
+                created_at=now - timedelta(seconds=i),
+            )
+            session.add(feedback)
+            if i % args.photo_every == 0:
+                session.flush()
+                data = synthetic_photo(i, args.photo_width, args.photo_height)
+                key = store.put(data)
+                record_feedback_photo(session, feedback.id, "air", key, len(data), "image/jpeg")
+                photo_bytes += len(data)
+                keys.append(key)
+            if i % 1000 == 999:
+                session.commit()
+        session.commit()
+    # New uploads get these right after upload, so the report normally finds them cached
+    pregenerate_thumbnails(keys)
+    print(f"Seeded {args.feedbacks} feedbacks, {len(keys)} photos ({photo_bytes / 1024 / 1024:.0f} MB)")
+
+def run(mode, workdir):
+    from sqlmodel import Session, select, func
+    from core.database import engine
+    from models import Feedback
+    from services.feedback_query import select_feedbacks
+    from services.reports import generate_pdf, build_feedback_report
+    from services.tasks import load_report_photos
+
+    since = datetime.utcnow() - timedelta(days=365)
+    start = time.perf_counter()
+    with Session(engine) as session:
+        if mode == "legacy":
+            # What generate_daily_report did before: all rows, all originals, then render
+            feedbacks = session.exec(select_feedbacks().where(Feedback.created_at >= since)).all()
+            photos = {f.id: load_report_photos(session, f) for f in feedbacks}
+            pdf = generate_pdf(feedbacks, photos)
+            rows = len(feedbacks)
+        else:
+            pdf = build_feedback_report(session, since)
+            rows = session.exec(select(func.count(Feedback.id)).where(Feedback.created_at >= since)).one()
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # kilobytes on Linux
+    print(json.dumps({"rows": rows, "seconds": elapsed, "peakRssMb": peak_kb / 1024, "pdfMb": len(pdf) / 1024 / 1024}))
+
+def main(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_report_")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        configure(workdir)
+        if not os.path.exists(os.path.join(workdir, "bench.db")):
+            seed(args)
+        modes = ["legacy", "streaming"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", mode, "--workdir", workdir],
+                check=True, capture_output=True, text=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(out)
+            print(
+                f"{mode:<9} {result['rows']:6d} rows  {result['seconds']:7.1f}s  "
+                f"peak RSS {result['peakRssMb']:7.1f} MB  PDF {result['pdfMb']:6.1f} MB"
+            )
+    finally:
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily report peak memory and wall time, legacy vs chunked")
+    parser.add_argument("--feedbacks", type=int, default=10000)
+    parser.add_argument("--photo-every", type=int, default=10, help="Every Nth feedback gets an air photo")
+    parser.add_argument("--photo-width", type=int, default=1600)
+    parser.add_argument("--photo-height", type=int, default=1200)
+    parser.add_argument("--mode", choices=["legacy", "streaming", "both"], default="both")
+    parser.add_argument("--workdir", help="Reuse (or create) a seeded scratch directory")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--run", choices=["legacy", "streaming"], help=argparse.SUPPRESS) # Child process mode
+    args = parser.parse_args()
+
+    if args.run:
+        configure(args.workdir)
+        run(args.run, args.workdir)
+    else:
+        main(args)
@@ -0,0 +1,95 @@
+import sys
+import time
+import asyncio
+import argparse
+
+import httpx
+
+# Measures how a burst of logins affects latency of an unrelated, cheap endpoint.
+# Password hashing must not block the event loop: probe p99 during the burst
+# should stay close to the idle baseline.
+#
+# Run against a live server, e.g.:
+#   uvicorn main:app --workers 1
+#   python scripts/bench_login.py --username super --password secret
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(label, latencies):
+    ms = [v * 1000 for v in latencies]
+    print(f"{label:<22} n={len(ms):<5} p50={percentile(ms, 50):7.1f}ms  p95={percentile(ms, 95):7.1f}ms  p99={percentile(ms, 99):7.1f}ms  max={max(ms, default=0):7.1f}ms")
+
+async def probe(client, path, headers, stop, latencies, interval):
+    while not stop.is_set():
+        start = time.perf_counter()
+        r = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        if r.status_code != 200:
+            print(f"Probe failed: {r.status_code} {r.text[:200]}")
+            stop.set()
+        await asyncio.sleep(interval)
+
+async def login(client, username, password, latencies):
+    start = time.perf_counter()
+    r = await client.post("/api/auth/login", json={"username": username, "password": password})
+    latencies.append(time.perf_counter() - start)
+    return r
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        r = await login(client, args.username, args.password, [])
+        if r.status_code != 200:
+            print(f"Login failed: {r.status_code} {r.text}")
+            sys.exit(1)
+        headers = {"Authorization": f"Bearer {r.json()['token']}"}
+
+        # 1. Idle baseline for the probe endpoint
+        baseline = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, args.probe_path, headers, stop, baseline, args.probe_interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await task
+
+        # 2. Same probe while a login burst is running
+        during = []
+        login_latencies = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, args.probe_path, headers, stop, during, args.probe_interval))
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one_login():
+            async with semaphore:
+                await login(client, args.username, args.password, login_latencies)
+
+        burst_start = time.perf_counter()
+        await asyncio.gather(*[one_login() for _ in range(args.logins)])
+        burst_seconds = time.perf_counter() - burst_start
+        stop.set()
+        await task
+
+    print(f"Probe endpoint: {args.probe_path}")
+    summarize("probe (idle)", baseline)
+    summarize("probe (login burst)", during)
+    summarize("login", login_latencies)
+    print(f"Burst: {args.logins} logins in {burst_seconds:.2f}s ({args.logins / burst_seconds:.1f}/s, concurrency {args.concurrency})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login burst vs. unrelated endpoint latency")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200, help="Logins in the burst")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent logins")
+    parser.add_argument("--probe-path", default="/api/auth/profile", help="Cheap authenticated endpoint to time")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="Seconds between probes")
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
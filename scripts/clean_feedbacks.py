@@ -6,7 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlmodel import Session, select, delete
 from core.database import engine
-from models import Feedback
+from models import Feedback, FeedbackDailyRollup
 
 def clean_feedbacks():
     print("Connecting to database...")
@@ -24,6 +24,7 @@ def clean_feedbacks():
         # Delete all
         print("Deleting all feedback records...")
         session.exec(delete(Feedback))
+        session.exec(delete(FeedbackDailyRollup))
         session.commit()
         
         # Verify
@@ -0,0 +1,24 @@
+import sys
+import os
+
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import engine
+from models import Feedback
+
+def migrate():
+    """
+    Creates indexes declared on the models that are missing from an existing
+    database (create_all only adds indexes when it creates the table).
+    """
+    for index in Feedback.__table__.indexes:
+        try:
+            index.create(engine, checkfirst=True)
+            print(f"Index {index.name} ok.")
+        except Exception as e:
+            print(f"Failed to create index {index.name}: {e}")
+    print("Index migration check complete.")
+
+if __name__ == "__main__":
+    migrate()
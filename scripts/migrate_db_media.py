@@ -0,0 +1,53 @@
+import sys
+import os
+import argparse
+
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from core.database import engine, create_db_and_tables
+from models import FeedbackMedia
+from services.media_ingest import normalize_pending_media
+
+NEW_COLUMNS = {
+    "original_sha256": "VARCHAR DEFAULT NULL",
+    "processed": "BOOLEAN NOT NULL DEFAULT FALSE",
+}
+
+def migrate():
+    """Adds the normalization columns to an existing feedback_media table."""
+    create_db_and_tables() # Creates feedback_media itself if it is missing
+
+    columns = {c["name"] for c in inspect(engine).get_columns("feedback_media")}
+    with engine.begin() as conn:
+        for name, ddl in NEW_COLUMNS.items():
+            if name in columns:
+                print(f"{name} column already exists.")
+                continue
+            print(f"Adding {name} column...")
+            conn.execute(text(f"ALTER TABLE feedback_media ADD COLUMN {name} {ddl}"))
+
+    for index in FeedbackMedia.__table__.indexes:
+        index.create(engine, checkfirst=True)
+    print("Media migration check complete.")
+
+def normalize_all(batch_size: int):
+    """Normalizes every photo not yet processed, instead of waiting for the scheduler."""
+    total = 0
+    while True:
+        done = normalize_pending_media(batch_size)
+        if not done:
+            break
+        total += done
+        print(f"Normalized {total} photos so far")
+    print(f"Normalization complete. {total} photos processed.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add feedback_media normalization columns")
+    parser.add_argument("--normalize", action="store_true", help="Also normalize all existing photos now")
+    parser.add_argument("--batch-size", type=int, default=100, help="Photos per transaction batch when normalizing")
+    args = parser.parse_args()
+    migrate()
+    if args.normalize:
+        normalize_all(args.batch_size)
@@ -0,0 +1,22 @@
+import sys
+import os
+import asyncio
+import signal
+
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import create_db_and_tables
+from services.outbox import run_worker
+
+async def main():
+    """Runs the outbox worker until SIGINT/SIGTERM, finishing in-flight jobs first."""
+    create_db_and_tables()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await run_worker(stop)
+
+if __name__ == "__main__":
+    asyncio.run(main())
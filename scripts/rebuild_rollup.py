@@ -0,0 +1,22 @@
+import sys
+import os
+
+# Add parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, select, func
+from core.database import engine, create_db_and_tables
+from models import FeedbackDailyRollup
+from services.rollup import rebuild_rollup
+
+def main():
+    create_db_and_tables()
+    with Session(engine) as session:
+        print("Rebuilding feedback_daily_rollup from feedback table...")
+        rebuild_rollup(session)
+        buckets = session.exec(select(func.count(FeedbackDailyRollup.id))).one()
+        total = session.exec(select(func.sum(FeedbackDailyRollup.count))).one() or 0
+        print(f"Rollup rebuilt: {buckets} buckets covering {total} feedback rows.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import FrozenSet
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.logger import get_logger
+from models import AdminUser, Feedback, FOMapping, UserROMapping
+from services.cache import access_scope_cache
+
+logger = get_logger(__name__)
+
+UNRESTRICTED_ROLES = ("superuser", "Vendor")
+MAPPED_ROLES = ("DO", "FO", "DRSM", "SRH")
+
+
+@dataclass(frozen=True)
+class AccessScope:
+    """
+    RO codes a user may see, resolved once per user and cached.
+    ro_codes drives list/aggregate filtering (apply_rbac); detail_ro_codes
+    drives single-feedback access checks (verify_feedback_access).
+    """
+    unrestricted: bool
+    ro_codes: FrozenSet[str] = frozenset()
+    detail_ro_codes: FrozenSet[str] = frozenset()
+
+    def can_list(self, ro_code: str) -> bool:
+        return self.unrestricted or ro_code in self.ro_codes
+
+    def can_view(self, ro_code: str) -> bool:
+        return self.unrestricted or ro_code in self.detail_ro_codes
+
+
+def _resolve(session: Session, user: AdminUser) -> AccessScope:
+    if user.role in UNRESTRICTED_ROLES:
+        return AccessScope(unrestricted=True)
+
+    if user.role in MAPPED_ROLES:
+        ro_codes = frozenset(session.exec(
+            select(UserROMapping.ro_code).where(UserROMapping.username == user.username)
+        ).all())
+    else:
+        # RO (or default admin) sees their branch
+        ro_codes = frozenset([user.branch_code]) if user.branch_code else frozenset()
+
+    if user.role == "DO":
+        # Branches whose RO user is in the DO's city
+        detail = frozenset(session.exec(
+            select(AdminUser.branch_code).where(AdminUser.role == "RO", AdminUser.city == user.city)
+        ).all())
+    elif user.role == "FO":
+        detail = frozenset(session.exec(
+            select(FOMapping.ro_code).where(FOMapping.fo_username == user.username)
+        ).all())
+    elif user.role == "RO":
+        detail = ro_codes
+    else:
+        detail = frozenset()
+
+    return AccessScope(unrestricted=False, ro_codes=ro_codes, detail_ro_codes=detail)
+
+def _cache_key(user: AdminUser) -> tuple:
+    # Includes the fields the scope depends on, so edited users never hit a stale entry
+    return (user.username, user.role, user.branch_code, user.city)
+
+def get_access_scope(session: Session, user: AdminUser) -> AccessScope:
+    """Cached AccessScope for the user."""
+    key = _cache_key(user)
+    scope = access_scope_cache.get(key)
+    if scope is None:
+        scope = _resolve(session, user)
+        access_scope_cache.set(key, scope)
+    return scope
+
+async def get_access_scope_async(session: AsyncSession, user: AdminUser) -> AccessScope:
+    """get_access_scope for routes on the async session."""
+    key = _cache_key(user)
+    scope = access_scope_cache.get(key)
+    if scope is None:
+        scope = await session.run_sync(_resolve, user)
+        access_scope_cache.set(key, scope)
+    return scope
+
+def invalidate_access_scopes() -> None:
+    """Call after user, RO mapping or FO mapping changes are committed."""
+    access_scope_cache.invalidate()
+
+
+def apply_rbac(scope: AccessScope, query, ro_column=None):
+    """
+    Applies Role-Based Access Control filters to the query.
+    scope comes from get_access_scope()/get_access_scope_async() for the current user.
+    ro_column defaults to Feedback.ro_number (pass FeedbackDailyRollup.ro_number for rollup queries).
+    """
+    ro_column = Feedback.ro_number if ro_column is None else ro_column
+    if scope.unrestricted:
+        return query
+    # Literal IN over the user's resolved (cached) RO set
+    return query.where(ro_column.in_(sorted(scope.ro_codes)))
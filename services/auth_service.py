@@ -1,38 +1,74 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session
+from sqlmodel import Session, select
 
 from core.config import settings
 from core.database import get_session
 from core.security import verify_password, get_password_hash, create_access_token, decode_token
 from models import AdminUser
+from services.cache import principal_cache
 
 # JWT handling
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-# Dependency
-async def get_current_admin(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> AdminUser:
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _token_subject(token: str) -> dict:
     payload = decode_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    username: str = payload.get("sub")
+    if payload is None or payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def invalidate_principal(username: Optional[str] = None) -> None:
+    """Drops the cached principal for username (or all). Call after user changes are committed."""
     if username is None:
-        raise credentials_exception
-        
-    admin_user = session.query(AdminUser).filter(AdminUser.username == username).first()
-    if admin_user is None:
-        raise credentials_exception
-    
-    if not admin_user.is_active:
+        principal_cache.invalidate()
+    else:
+        principal_cache.pop(username)
+
+# Dependency
+async def get_current_admin(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> AdminUser:
+    """
+    The authenticated AdminUser. Served from a short-TTL cache keyed by the token
+    subject, so the returned object is detached: reload it with session.get()
+    before modifying it.
+    """
+    username: str = _token_subject(token)["sub"]
+
+    snapshot = principal_cache.get(username)
+    if snapshot is None:
+        admin_user = session.exec(select(AdminUser).where(AdminUser.username == username)).first()
+        if admin_user is None:
+            raise _credentials_exception()
+        # The password hash is never kept in the cache
+        snapshot = admin_user.model_dump(exclude={"password_hash"})
+        principal_cache.set(username, snapshot)
+
+    if not snapshot["is_active"]:
         raise HTTPException(status_code=400, detail="Inactive user")
-        
-    return admin_user
+
+    return AdminUser(**snapshot)
+
+@dataclass(frozen=True)
+class TokenClaims:
+    username: str
+    role: Optional[str]
+    branch_code: Optional[str]
+
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    """
+    Claims-only fast path: validates the token without touching the database.
+    Role/branch are as of token issue, and a deactivated or deleted user's token
+    keeps passing until it expires. Only use it on routes where such stale
+    claims are acceptable; anything exposing data should use get_current_admin.
+    """
+    payload = _token_subject(token)
+    return TokenClaims(username=payload["sub"], role=payload.get("role"), branch_code=payload.get("branch"))
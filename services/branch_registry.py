@@ -0,0 +1,99 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.config import settings
+from core.logger import get_logger
+from models_refactor import Branch
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class BranchInfo:
+    """Detached snapshot of a branch row."""
+    ro_code: str
+    name: str
+    city: str
+    region: Optional[str] = None
+
+    @classmethod
+    def from_branch(cls, branch: Branch) -> "BranchInfo":
+        return cls(ro_code=branch.ro_code, name=branch.name, city=branch.city, region=branch.region)
+
+
+class BranchRegistry:
+    """
+    In-memory copy of the branch table (~1,300 rows, changed only by Excel
+    uploads and the branches API). Loaded at startup, updated by those
+    writers and reloaded after ttl seconds so edits made by other worker
+    processes show up. Codes missing from the copy fall back to the DB.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._branches: Dict[str, BranchInfo] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _replace(self, branches: List[Branch]) -> None:
+        snapshot = {b.ro_code: BranchInfo.from_branch(b) for b in branches}
+        with self._lock:
+            self._branches = snapshot
+            self._loaded_at = time.monotonic()
+
+    def load(self, session: Session) -> int:
+        """(Re)reads the whole table. Returns the number of branches."""
+        self._replace(session.exec(select(Branch)).all())
+        logger.info(f"Branch registry loaded: {len(self._branches)} branches")
+        return len(self._branches)
+
+    def put(self, branch: Branch) -> None:
+        with self._lock:
+            self._branches[branch.ro_code] = BranchInfo.from_branch(branch)
+
+    def remove(self, ro_code: str) -> None:
+        with self._lock:
+            self._branches.pop(ro_code, None)
+
+    def get(self, session: Session, ro_code: str) -> Optional[BranchInfo]:
+        if self._is_stale():
+            self.load(session)
+        info = self._branches.get(ro_code)
+        if info is None:
+            # Created elsewhere since the last load (another worker, direct SQL)
+            branch = session.get(Branch, ro_code)
+            if branch:
+                self.put(branch)
+                info = self._branches[ro_code]
+        return info
+
+    async def get_async(self, session: AsyncSession, ro_code: str) -> Optional[BranchInfo]:
+        if self._is_stale():
+            self._replace((await session.exec(select(Branch))).all())
+        info = self._branches.get(ro_code)
+        if info is None:
+            branch = await session.get(Branch, ro_code)
+            if branch:
+                self.put(branch)
+                info = self._branches[ro_code]
+        return info
+
+    def all(self, session: Session) -> List[BranchInfo]:
+        if self._is_stale():
+            self.load(session)
+        return list(self._branches.values())
+
+    def stats(self) -> dict:
+        age = None if self._loaded_at is None else round(time.monotonic() - self._loaded_at, 1)
+        return {"branches": len(self._branches), "ttlSeconds": self.ttl, "ageSeconds": age}
+
+
+branch_registry = BranchRegistry(ttl=settings.BRANCH_REGISTRY_TTL_SECONDS)
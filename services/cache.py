@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from core.config import settings
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small in-process cache with per-entry expiry and LRU eviction.
+    Thread-safe; values are returned as stored, so callers must not mutate them.
+    """
+
+    def __init__(self, name: str, ttl_seconds: int, max_entries: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Drops a single entry."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def invalidate(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def make_key(namespace: str, scope: Optional[tuple], **params) -> tuple:
+    """
+    Cache key from a namespace, a resolved RO scope (None = unrestricted) and
+    request params. None params are dropped so omitted and null filters match.
+    """
+    if scope is None:
+        scope_hash = "*"
+    else:
+        scope_hash = hashlib.sha1("\n".join(sorted(scope)).encode()).hexdigest()
+    normalized = tuple(sorted((k, str(v)) for k, v in params.items() if v is not None))
+    return (namespace, scope_hash, normalized)
+
+
+# Dashboard aggregates. Invalidated on every feedback write.
+dashboard_cache = TTLCache(
+    "dashboard",
+    settings.DASHBOARD_CACHE_TTL_SECONDS,
+    settings.DASHBOARD_CACHE_MAX_ENTRIES,
+)
+
+# Resolved per-user RO access scopes. Invalidated on user/mapping changes.
+access_scope_cache = TTLCache(
+    "access_scope",
+    settings.ACCESS_SCOPE_CACHE_TTL_SECONDS,
+    settings.ACCESS_SCOPE_CACHE_MAX_ENTRIES,
+)
+
+# Authenticated AdminUser snapshots by token subject. Invalidated on user changes.
+principal_cache = TTLCache(
+    "principal",
+    settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+)
+
+_caches = [dashboard_cache, access_scope_cache, principal_cache]
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {cache.name: cache.stats() for cache in _caches}
@@ -0,0 +1,280 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import update, or_
+from sqlmodel import Session, select
+
+from core.config import settings
+from core.database import engine
+from core.logger import get_logger
+from models import AdminUser, ExportJob, Feedback
+from services.access_scope import AccessScope
+from services.feedback_query import apply_common_filters
+
+logger = get_logger(__name__)
+
+EXPORT_CHUNK_SIZE = 1000 # Rows fetched per round trip while streaming an export
+
+EXPORT_COLUMNS = (
+    Feedback.id, Feedback.created_at, Feedback.phone, Feedback.ro_number,
+    Feedback.rating_air, Feedback.rating_washroom, Feedback.rating_water,
+    Feedback.comment, Feedback.status, Feedback.reviewed_by,
+)
+EXPORT_HEADER = ['ID', 'Date', 'Phone Number', 'RO Code', 'Free Air Rating', 'Washroom Rating', 'Drinking Water Rating', 'Comments', 'Status', 'Reviewed By']
+
+# format -> (file suffix, media type)
+EXPORT_FORMATS = {
+    "csv": (".csv.gz", "application/gzip"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+ACTIVE_STATUSES = ("queued", "running")
+# Missed heartbeats after which a job's process is presumed dead
+STALE_HEARTBEATS = 4
+
+
+# --- Export query (shared with the streaming CSV endpoint) ---
+
+def parse_export_dates(start_date: Optional[str], end_date: Optional[str]):
+    """(start, end) datetimes from YYYY-MM-DD or ISO strings; end is end of day. Raises ValueError."""
+    dt_start = dt_end = None
+    if start_date:
+        dt_start = datetime.strptime(start_date.split('T')[0], "%Y-%m-%d")
+    if end_date:
+        dt_end = datetime.strptime(end_date.split('T')[0], "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+    return dt_start, dt_end
+
+def export_query(scope: AccessScope, ro_code: Optional[str], status: Optional[str], dt_start: Optional[datetime], dt_end: Optional[datetime]):
+    """RBAC-filtered SELECT of the exported columns, newest first, set up for streaming."""
+    query = apply_common_filters(scope, select(*EXPORT_COLUMNS), ro_code, status, dt_start, dt_end)
+    return query.order_by(Feedback.created_at.desc()).execution_options(
+        stream_results=True, yield_per=EXPORT_CHUNK_SIZE
+    )
+
+def export_row(f, timezone_offset: int = 0) -> list:
+    """One export row. timezone_offset is in minutes to add to UTC (IST = 330)."""
+    created = (f.created_at + timedelta(minutes=timezone_offset)).strftime('%Y-%m-%d %H:%M') if f.created_at else ""
+    return [
+        f.id,
+        created,
+        f.phone,
+        f.ro_number or 'N/A',
+        f.rating_air,
+        f.rating_washroom,
+        f.rating_water,
+        f.comment or '',
+        f.status,
+        f.reviewed_by or 'N/A',
+    ]
+
+
+# --- Jobs ---
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Makes "find an in-flight job or create one" atomic within this process
+_submit_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, settings.EXPORT_WORKERS), thread_name_prefix="export")
+    return _executor
+
+def _worker_id() -> str:
+    # Jobs live in this process's executor, so the process is their owner
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _scope_codes(scope: AccessScope) -> Optional[list]:
+    return None if scope.unrestricted else sorted(scope.ro_codes)
+
+def export_fingerprint(params: dict, fmt: str) -> str:
+    """Identical for requests that would produce the same file (params include the visible RO set)."""
+    payload = json.dumps({"format": fmt, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def submit_export_job(session: Session, user: AdminUser, scope: AccessScope, fmt: str, ro_code: Optional[str] = None,
+                      status: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      timezone_offset: int = 0) -> ExportJob:
+    """
+    Queues an export and returns its job. If an identical export (same visible
+    ROs, filters and format) is already queued or running, that job is returned
+    instead, so concurrent identical requests cost a single scan.
+    """
+    params = {
+        "ro_codes": _scope_codes(scope),
+        "roCode": ro_code,
+        "status": status,
+        "startDate": start_date,
+        "endDate": end_date,
+        "timezone_offset": timezone_offset,
+    }
+    fingerprint = export_fingerprint(params, fmt)
+
+    with _submit_lock:
+        existing = session.exec(
+            select(ExportJob)
+            .where(ExportJob.fingerprint == fingerprint, ExportJob.status.in_(ACTIVE_STATUSES))
+            .order_by(ExportJob.created_at.desc())
+        ).first()
+        if existing:
+            logger.info(f"Export request by {user.username} joined job {existing.id}")
+            return existing
+
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            fingerprint=fingerprint,
+            requested_by=user.username,
+            format=fmt,
+            params=json.dumps(params),
+            worker_id=_worker_id(),
+            heartbeat_at=datetime.utcnow(),
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+
+    _get_executor().submit(run_export_job, job.id)
+    logger.info(f"Export job {job.id} ({fmt}) queued for {user.username}")
+    return job
+
+def can_access_job(job: ExportJob, user: AdminUser, scope: AccessScope) -> bool:
+    """The requester, or anyone whose visible RO set covers the job's (jobs are shared)."""
+    if job.requested_by == user.username or scope.unrestricted:
+        return True
+    job_codes = json.loads(job.params).get("ro_codes")
+    return job_codes is not None and set(job_codes) <= scope.ro_codes
+
+def _write_csv(path: str, rows, timezone_offset: int) -> int:
+    count = 0
+    with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_HEADER)
+        for chunk in rows.partitions():
+            for row in chunk:
+                writer.writerow(export_row(row, timezone_offset))
+            count += len(chunk)
+    return count
+
+def _write_xlsx(path: str, rows, timezone_offset: int) -> int:
+    from openpyxl import Workbook # Only needed for xlsx jobs
+
+    # write_only streams rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Feedbacks")
+    sheet.append(EXPORT_HEADER)
+    count = 0
+    for chunk in rows.partitions():
+        for row in chunk:
+            sheet.append(export_row(row, timezone_offset))
+        count += len(chunk)
+    workbook.save(path)
+    return count
+
+_WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx}
+
+def run_export_job(job_id: str) -> None:
+    """Worker body: streams the query into EXPORT_DIR, then marks the job done or failed."""
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        if job is None or job.status != "queued":
+            return
+        job.status = "running"
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+        params = json.loads(job.params)
+        ro_codes = params["ro_codes"]
+        # The scope is frozen at submit time; the worker never re-resolves the user
+        scope = AccessScope(unrestricted=ro_codes is None, ro_codes=frozenset(ro_codes or ()))
+
+        export_dir = Path(settings.EXPORT_DIR)
+        export_dir.mkdir(parents=True, exist_ok=True)
+        path = export_dir / f"{job.id}{EXPORT_FORMATS[job.format][0]}"
+        # Written under a temp name so a half-written file is never served
+        fd, tmp_path = tempfile.mkstemp(dir=export_dir, prefix=".tmp-")
+        os.close(fd)
+        try:
+            dt_start, dt_end = parse_export_dates(params["startDate"], params["endDate"])
+            query = export_query(scope, params["roCode"], params["status"], dt_start, dt_end)
+            rows = session.exec(query)
+            job.row_count = _WRITERS[job.format](tmp_path, rows, params["timezone_offset"])
+            os.replace(tmp_path, path)
+            job.file_path = str(path)
+            job.status = "done"
+            logger.info(f"Export job {job.id} finished: {job.row_count} rows")
+        except Exception as e:
+            logger.error(f"Export job {job.id} failed: {e}", exc_info=True)
+            session.rollback()
+            job.status = "failed"
+            job.error = str(e)[:500]
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        job.finished_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+def heartbeat_export_jobs() -> int:
+    """
+    Scheduled in every process: refreshes the heartbeat of the jobs this process
+    owns, then fails other processes' jobs that have stopped beating.
+    """
+    with Session(engine) as session:
+        result = session.exec(
+            update(ExportJob)
+            .where(ExportJob.worker_id == _worker_id(), ExportJob.status.in_(ACTIVE_STATUSES))
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        session.commit()
+        fail_interrupted_export_jobs(session)
+    return result.rowcount
+
+def fail_interrupted_export_jobs(session: Session) -> int:
+    """
+    Marks queued/running jobs whose owning process has stopped heartbeating as
+    failed (it died or was restarted). Jobs of live workers are left alone, so
+    this is safe to run from every process, at startup and on a schedule.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.EXPORT_HEARTBEAT_SECONDS * STALE_HEARTBEATS)
+    # One conditional UPDATE, so a heartbeat landing mid-sweep keeps its job alive
+    result = session.exec(
+        update(ExportJob)
+        .where(
+            ExportJob.status.in_(ACTIVE_STATUSES),
+            or_(ExportJob.heartbeat_at == None, ExportJob.heartbeat_at < cutoff),
+        )
+        .values(status="failed", error="Interrupted: the worker running it stopped", finished_at=now)
+    )
+    session.commit()
+    if result.rowcount:
+        logger.warning(f"Marked {result.rowcount} interrupted export jobs as failed")
+    return result.rowcount
+
+def cleanup_export_jobs() -> int:
+    """Deletes finished jobs older than EXPORT_RETENTION_HOURS along with their files."""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.EXPORT_RETENTION_HOURS)
+    with Session(engine) as session:
+        jobs = session.exec(
+            select(ExportJob).where(ExportJob.status.not_in(ACTIVE_STATUSES), ExportJob.finished_at < cutoff)
+        ).all()
+        for job in jobs:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            session.delete(job)
+        session.commit()
+    if jobs:
+        logger.info(f"Removed {len(jobs)} expired export jobs")
+    return len(jobs)
@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from typing import Optional, Union
+
+from sqlalchemy.orm import defer
+from sqlmodel import Session, select
+
+from models import Feedback
+from services.access_scope import AccessScope, apply_rbac
+from services.media_store import PHOTO_KINDS, photo_exists_clause
+
+# Legacy blob columns. They are kept out of every list/aggregate SELECT and only
+# loaded (lazily, one column at a time) when a photo is actually served.
+PHOTO_FIELDS = tuple(f"photo_{kind}" for kind in PHOTO_KINDS)
+
+
+def defer_photos():
+    """Loader options that leave the photo_* blob columns out of the SELECT."""
+    return [defer(getattr(Feedback, field)) for field in PHOTO_FIELDS]
+
+def has_photo_column(kind: str):
+    """`has_photo_<kind>` flag computed in SQL (column IS NOT NULL or a media row exists)."""
+    return photo_exists_clause(kind).label(f"has_photo_{kind}")
+
+def select_feedbacks():
+    """select(Feedback) with the blob columns deferred."""
+    return select(Feedback).options(*defer_photos())
+
+def select_feedbacks_with_photo_flags():
+    """
+    select(Feedback, has_photo_air, has_photo_washroom, has_photo_water, has_photo_receipt)
+    with the blob columns deferred. Rows unpack as (feedback, flags...).
+    """
+    return select(Feedback, *[has_photo_column(kind) for kind in PHOTO_KINDS]).options(*defer_photos())
+
+def photo_flags(row) -> dict:
+    """Maps a row from select_feedbacks_with_photo_flags() to {kind: bool}."""
+    return {kind: bool(row[i + 1]) for i, kind in enumerate(PHOTO_KINDS)}
+
+def get_feedback(session: Session, feedback_id: int) -> Optional[Feedback]:
+    """session.get(Feedback, id) without loading the blob columns."""
+    return session.get(Feedback, feedback_id, options=defer_photos())
+
+def feedback_to_dict(feedback: Feedback) -> dict:
+    """Column values of a feedback row, excluding the (possibly unloaded) blob columns."""
+    return {
+        name: getattr(feedback, name)
+        for name in Feedback.model_fields
+        if name not in PHOTO_FIELDS
+    }
+
+def apply_date_filter(query, start_date: Optional[Union[date, datetime]] = None, end_date: Optional[Union[date, datetime]] = None):
+    """Applies date range filters to the query."""
+    if start_date:
+        # If it's a date object, convert to datetime at start of day
+        dt_start = datetime.combine(start_date, datetime.min.time()) if isinstance(start_date, date) and not isinstance(start_date, datetime) else start_date
+        query = query.where(Feedback.created_at >= dt_start)
+    if end_date:
+        # If it's a date object, convert to datetime at end of day
+        dt_end = datetime.combine(end_date, datetime.max.time()) if isinstance(end_date, date) and not isinstance(end_date, datetime) else end_date
+        query = query.where(Feedback.created_at <= dt_end)
+    return query
+
+def apply_common_filters(scope: AccessScope, query, ro_code: Optional[str] = None, status: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """Applies RBAC, ro_code, status, and date filters."""
+    query = apply_rbac(scope, query)
+    
+    if ro_code:
+        query = query.where(Feedback.ro_number == ro_code)
+    if status:
+        query = query.where(Feedback.status == status)
+    
+    query = apply_date_filter(query, start_date, end_date)
+    return query
@@ -0,0 +1,146 @@
+import io
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image, ImageCms, ImageOps
+from sqlmodel import Session, select
+
+from core.config import settings
+from core.database import engine
+from core.logger import get_logger
+from models import FeedbackMedia
+from services.media_store import get_media_store, delete_blob_if_unreferenced
+from services.thumbnails import pregenerate_thumbnails
+
+logger = get_logger(__name__)
+
+# The request's own background task normally handles new uploads; the sweep
+# leaves them alone for this long so the two don't race
+SWEEP_GRACE_PERIOD = timedelta(minutes=5)
+SWEEP_BATCH_SIZE = 50
+SRGB_PROFILE = ImageCms.createProfile("sRGB")
+
+
+def normalize_image(data: bytes) -> Optional[Tuple[bytes, str]]:
+    """
+    (bytes, content_type) of the photo re-encoded as JPEG without metadata,
+    orientation applied, colours converted to sRGB and the longest side capped
+    at MEDIA_MAX_DIMENSION.
+    None means keep the upload as is (PDF, or re-encoding would only make a
+    metadata-free image bigger). Raises if the image can't be decoded.
+    """
+    if data.startswith(b"%PDF"):
+        return None
+
+    max_dim = settings.MEDIA_MAX_DIMENSION
+    with Image.open(io.BytesIO(data)) as img:
+        has_metadata = any(key in img.info for key in ("exif", "xmp", "icc_profile", "comment"))
+        img.draft("RGB", (max_dim, max_dim)) # JPEG decodes at a reduced scale when it can
+        img = ImageOps.exif_transpose(img) # Orientation lives in EXIF, which is about to go
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        icc_profile = None
+        if img.info.get("icc_profile"):
+            # Dropping a Display P3/Adobe RGB profile without converting would shift the colours
+            try:
+                img = ImageCms.profileToProfile(
+                    img, ImageCms.ImageCmsProfile(io.BytesIO(img.info["icc_profile"])), SRGB_PROFILE, outputMode="RGB"
+                )
+            except (ImageCms.PyCMSError, OSError, ValueError) as e:
+                logger.warning(f"Could not convert photo to sRGB, keeping its ICC profile: {e}")
+                icc_profile = img.info["icc_profile"]
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        # No exif/xmp arguments: only the pixels (and an unconvertible ICC profile) are written
+        options = {"icc_profile": icc_profile} if icc_profile else {}
+        img.save(buf, format="JPEG", quality=settings.MEDIA_JPEG_QUALITY, optimize=True, progressive=True, **options)
+
+    normalized = buf.getvalue()
+    if len(normalized) >= len(data) and not has_metadata:
+        return None
+    return normalized, "image/jpeg"
+
+def normalize_media(session: Session, media: FeedbackMedia) -> bool:
+    """
+    Normalizes one feedback_media row in place and marks it processed.
+    Returns True if the stored photo was replaced. Commits.
+    """
+    store = get_media_store()
+    original_key = media.sha256
+    replaced = False
+
+    data = store.get(original_key)
+    if data is None:
+        logger.error(f"Media blob {original_key} missing for feedback {media.feedback_id} ({media.kind})")
+    else:
+        try:
+            result = normalize_image(data)
+        except Exception as e:
+            # Undecodable images are kept as uploaded rather than retried forever
+            logger.warning(f"Could not normalize media {media.id}: {e}")
+            result = None
+        if result:
+            normalized, content_type = result
+            media.sha256 = store.put(normalized)
+            media.size = len(normalized)
+            media.content_type = content_type
+            if settings.MEDIA_KEEP_ORIGINALS:
+                media.original_sha256 = original_key
+            replaced = media.sha256 != original_key
+            logger.info(f"Normalized media {media.id}: {len(data)} -> {len(normalized)} bytes")
+
+    media.processed = True
+    session.add(media)
+    session.commit()
+
+    if replaced and not settings.MEDIA_KEEP_ORIGINALS:
+        delete_blob_if_unreferenced(session, original_key)
+    return replaced
+
+def process_uploaded_media(media_ids: Iterable[int]) -> None:
+    """
+    Background task for new uploads: normalizes each photo (when enabled) and
+    then renders its default thumbnails from the stored result.
+    """
+    keys = []
+    with Session(engine) as session:
+        for media_id in media_ids:
+            media = session.get(FeedbackMedia, media_id)
+            if media is None:
+                continue
+            try:
+                if settings.MEDIA_NORMALIZE and not media.processed:
+                    normalize_media(session, media)
+                keys.append(media.sha256)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Failed to process media {media_id}: {e}")
+    pregenerate_thumbnails(keys)
+
+def normalize_pending_media(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """
+    Normalizes up to batch_size unprocessed photos older than the grace period
+    (WhatsApp uploads, backfilled rows, anything a background task missed).
+    Returns how many rows were processed.
+    """
+    if not settings.MEDIA_NORMALIZE:
+        return 0
+    cutoff = datetime.utcnow() - SWEEP_GRACE_PERIOD
+    processed = 0
+    with Session(engine) as session:
+        rows = session.exec(
+            select(FeedbackMedia)
+            .where(FeedbackMedia.processed == False, FeedbackMedia.created_at < cutoff)
+            .order_by(FeedbackMedia.id)
+            .limit(batch_size)
+        ).all()
+        for media in rows:
+            try:
+                normalize_media(session, media)
+                processed += 1
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Failed to normalize media {media.id}: {e}")
+    if processed:
+        logger.info(f"Normalized {processed} pending photos")
+    return processed
@@ -0,0 +1,326 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, Optional, Set, Tuple
+
+from sqlmodel import Session, select, exists, and_, or_
+
+from core.config import settings
+from core.database import engine
+from core.logger import get_logger
+from models import Feedback, FeedbackMedia
+from services import outbox
+
+logger = get_logger(__name__)
+
+PHOTO_KINDS = ("air", "washroom", "water", "receipt")
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def detect_content_type(data: bytes) -> str:
+    """Detects the MIME type of an uploaded photo/receipt from its magic bytes."""
+    if data[:4] == b'\x89PNG':
+        return "image/png"
+    if data[:4] == b'%PDF':
+        return "application/pdf"
+    return "image/jpeg"
+
+
+class MediaStore(ABC):
+    """
+    Content-addressed blob store. Blobs are keyed by the hex SHA-256 of their
+    content, so identical uploads are stored once. Putting content that is
+    already stored still counts as a write for delete_if_idle.
+    """
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def put_file(self, f: BinaryIO) -> Tuple[str, int]:
+        """Stores the rest of a readable binary file without loading it into memory. Returns (key, size)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Seekable binary file for the blob (caller closes), for streaming and range reads."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Deletes the blob and any derived blobs stored for it."""
+
+    @abstractmethod
+    def delete_if_idle(self, key: str, idle_seconds: float) -> bool:
+        """
+        Like delete, but keeps the blob if it was put within the last
+        idle_seconds, atomically with respect to concurrent puts of the same
+        content. Returns False if the blob was kept.
+        """
+
+    # Derived blobs (e.g. thumbnails) are stored under the source key plus a
+    # variant name, so they can be found without a DB lookup.
+
+    @abstractmethod
+    def put_derived(self, key: str, variant: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def get_derived(self, key: str, variant: str) -> Optional[bytes]:
+        ...
+
+
+class LocalMediaStore(MediaStore):
+    """Stores blobs on the local filesystem under root/ab/cd/abcd...."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def _derived_path(self, key: str, variant: str) -> Path:
+        return self._path(key).with_name(f"{key}.{variant}")
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _touch(self, path: Path) -> bool:
+        """Marks an existing blob as just written; False if there is none (or it is being deleted)."""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key)
+        if not self._touch(path):
+            self._write(path, data)
+        return key
+
+    def put_file(self, f: BinaryIO) -> Tuple[str, int]:
+        # The key is only known once the content has been read, so stream into
+        # a temp file under root while hashing, then move it into place
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := f.read(COPY_CHUNK_SIZE):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            path = self._path(key)
+            if self._touch(path):
+                os.remove(tmp_path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key, size
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
+        for derived in path.parent.glob(f"{key}.*"):
+            derived.unlink()
+
+    def delete_if_idle(self, key: str, idle_seconds: float) -> bool:
+        path = self._path(key)
+        # Move the blob aside first: a put that comes later finds nothing to
+        # touch and writes a fresh copy, and one that touched it earlier shows
+        # up in the mtime we read from the moved file
+        doomed = path.with_name(f".gc-{key}-{uuid.uuid4().hex}")
+        try:
+            os.rename(path, doomed)
+        except FileNotFoundError:
+            self.delete(key)
+            return True
+        if time.time() - doomed.stat().st_mtime < idle_seconds:
+            # Same content either way, so replacing a copy put meanwhile is fine
+            os.rename(doomed, path)
+            return False
+        doomed.unlink()
+        self.delete(key)
+        return True
+
+    def put_derived(self, key: str, variant: str, data: bytes) -> None:
+        self._write(self._derived_path(key, variant), data)
+
+    def get_derived(self, key: str, variant: str) -> Optional[bytes]:
+        path = self._derived_path(key, variant)
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+
+_store: Optional[MediaStore] = None
+
+def get_media_store() -> MediaStore:
+    global _store
+    if _store is None:
+        if settings.MEDIA_STORE_BACKEND == "local":
+            _store = LocalMediaStore(settings.MEDIA_ROOT)
+        else:
+            raise ValueError(f"Unknown media store backend: {settings.MEDIA_STORE_BACKEND}")
+    return _store
+
+# --- Feedback photo helpers ---
+
+def record_feedback_photo(session: Session, feedback_id: int, kind: str, key: str, size: int, content_type: str) -> FeedbackMedia:
+    """Records (or replaces) the feedback_media row for a blob already in the store. Caller commits."""
+    media = session.exec(
+        select(FeedbackMedia).where(FeedbackMedia.feedback_id == feedback_id, FeedbackMedia.kind == kind)
+    ).first()
+    if not media:
+        media = FeedbackMedia(feedback_id=feedback_id, kind=kind, sha256=key, size=size)
+    media.sha256 = key
+    media.size = size
+    media.content_type = content_type
+    # A new upload starts over in the ingest pipeline
+    media.original_sha256 = None
+    media.processed = False
+    session.add(media)
+    return media
+
+def save_feedback_photo(session: Session, feedback_id: int, kind: str, data: bytes) -> FeedbackMedia:
+    """
+    Writes the photo to the media store and records (or replaces) the
+    feedback_media row for this feedback/kind. Caller commits.
+    """
+    key = get_media_store().put(data)
+    return record_feedback_photo(session, feedback_id, kind, key, len(data), detect_content_type(data))
+
+def get_feedback_media(session: Session, feedback_id: int, kind: str) -> Optional[FeedbackMedia]:
+    return session.exec(
+        select(FeedbackMedia).where(FeedbackMedia.feedback_id == feedback_id, FeedbackMedia.kind == kind)
+    ).first()
+
+def load_feedback_photo(session: Session, feedback: Feedback, kind: str) -> Optional[bytes]:
+    """
+    Returns the photo bytes for the given kind. Reads from the media store and
+    falls back to the legacy photo_* column for rows not yet backfilled.
+    """
+    media = get_feedback_media(session, feedback.id, kind)
+    if media:
+        data = get_media_store().get(media.sha256)
+        if data is None:
+            logger.error(f"Media blob {media.sha256} missing for feedback {feedback.id} ({kind})")
+        return data
+    return getattr(feedback, f"photo_{kind}")
+
+@dataclass
+class PhotoSource:
+    """What an HTTP response needs to validate/serve a photo without loading it."""
+    sha256: str
+    size: int
+    content_type: str
+    open: Callable[[], Optional[BinaryIO]]
+
+def get_photo_source(session: Session, feedback: Feedback, kind: str) -> Optional[PhotoSource]:
+    """
+    Metadata plus an opener for a feedback photo. For media-store photos this
+    only reads the feedback_media row; legacy photo_* columns have to be loaded
+    (and hashed) until they are backfilled.
+    """
+    media = get_feedback_media(session, feedback.id, kind)
+    if media:
+        key = media.sha256
+        return PhotoSource(key, media.size, media.content_type, lambda: get_media_store().open(key))
+
+    data = getattr(feedback, f"photo_{kind}")
+    if not data:
+        return None
+    return PhotoSource(
+        hashlib.sha256(data).hexdigest(), len(data), detect_content_type(data),
+        lambda: io.BytesIO(data),
+    )
+
+def photo_exists_clause(kind: str):
+    """SQL expression that is true when the feedback has a photo of this kind."""
+    legacy_col = getattr(Feedback, f"photo_{kind}")
+    in_store = exists().where(and_(FeedbackMedia.feedback_id == Feedback.id, FeedbackMedia.kind == kind))
+    return or_(legacy_col != None, in_store)
+
+def delete_feedback_media(session: Session, feedback_id: int) -> Set[str]:
+    """
+    Removes the media rows for a feedback and returns the blob keys they held.
+    Caller commits, then passes the keys to delete_blob_if_unreferenced; blobs
+    are never removed before the rows that point at them are gone for good.
+    """
+    rows = session.exec(select(FeedbackMedia).where(FeedbackMedia.feedback_id == feedback_id)).all()
+    keys = {m.sha256 for m in rows} | {m.original_sha256 for m in rows if m.original_sha256}
+    for m in rows:
+        session.delete(m)
+    return keys
+
+def delete_blob_if_unreferenced(session: Session, key: str) -> bool:
+    """
+    Deletes a blob (and its derived blobs) unless a feedback_media row still
+    points at it. An upload stores its blob before committing its row, so a
+    blob put within MEDIA_GC_GRACE_SECONDS is kept and checked again later
+    (a media_gc outbox job, committed here).
+    """
+    still_used = session.exec(
+        select(FeedbackMedia.id).where(or_(FeedbackMedia.sha256 == key, FeedbackMedia.original_sha256 == key))
+    ).first()
+    if still_used:
+        return False
+    if get_media_store().delete_if_idle(key, settings.MEDIA_GC_GRACE_SECONDS):
+        return True
+    logger.info(f"Media blob {key} was written recently; checking again in {settings.MEDIA_GC_GRACE_SECONDS}s")
+    outbox.enqueue(session, "media_gc", {"keys": [key]}, delay_seconds=settings.MEDIA_GC_GRACE_SECONDS)
+    session.commit()
+    return False
+
+def collect_media_blobs(keys: Iterable[str]) -> None:
+    """Outbox media_gc handler: retries delete_blob_if_unreferenced for blobs kept earlier."""
+    with Session(engine) as session:
+        for key in keys:
+            delete_blob_if_unreferenced(session, key)
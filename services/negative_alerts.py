@@ -0,0 +1,91 @@
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import update, delete
+from sqlmodel import Session, select
+
+from core.config import settings
+from core.database import engine
+from core.logger import get_logger
+from models import Feedback, NegativeAlert
+from services import outbox
+
+logger = get_logger(__name__)
+
+# Sent alerts are only needed for window lookups; older rows are purged daily
+ALERT_RETENTION = timedelta(days=7)
+
+
+def is_negative(feedback: Feedback) -> bool:
+    return 1 in (feedback.rating_air, feedback.rating_washroom, feedback.rating_water)
+
+def queue_negative_alert(session: Session, feedback: Feedback) -> Optional[str]:
+    """
+    Queues the alert for a negative feedback in the caller's transaction (sync
+    session; use run_sync from async code). The first negative at an RO is
+    alerted immediately and opens a NEGATIVE_ALERT_WINDOW_SECONDS window; the
+    ones that follow within it are mailed as one digest when it closes.
+    Returns "immediate" or "digest" (None if the feedback was already queued).
+    """
+    if session.get(NegativeAlert, feedback.id):
+        return None
+    ro_code = feedback.ro_number or "-"
+    now = datetime.utcnow()
+    window = timedelta(seconds=settings.NEGATIVE_ALERT_WINDOW_SECONDS)
+
+    opener = None
+    if window:
+        opener = session.exec(
+            select(NegativeAlert)
+            .where(NegativeAlert.ro_code == ro_code, NegativeAlert.mode == "immediate", NegativeAlert.created_at > now - window)
+            .order_by(NegativeAlert.created_at.desc())
+        ).first()
+
+    if opener is None:
+        session.add(NegativeAlert(feedback_id=feedback.id, ro_code=ro_code, mode="immediate", created_at=now))
+        outbox.enqueue(session, "negative_alert", {"feedback_id": feedback.id})
+        return "immediate"
+
+    # One digest job per window; it sends every unsent digest row of the RO
+    digest_queued = session.exec(
+        select(NegativeAlert.feedback_id).where(
+            NegativeAlert.ro_code == ro_code,
+            NegativeAlert.mode == "digest",
+            NegativeAlert.digest_sent_at == None,
+            NegativeAlert.created_at >= opener.created_at,
+        )
+    ).first() is not None
+    session.add(NegativeAlert(feedback_id=feedback.id, ro_code=ro_code, mode="digest", created_at=now))
+    if not digest_queued:
+        closes_in = (opener.created_at + window - now).total_seconds()
+        outbox.enqueue(session, "negative_alert_digest", {"ro_code": ro_code}, delay_seconds=max(0, math.ceil(closes_in)))
+    return "digest"
+
+def pending_digest_ids(session: Session, ro_code: str) -> List[int]:
+    """Feedback ids collected for the RO's next digest, oldest first."""
+    return session.exec(
+        select(NegativeAlert.feedback_id)
+        .where(NegativeAlert.ro_code == ro_code, NegativeAlert.mode == "digest", NegativeAlert.digest_sent_at == None)
+        .order_by(NegativeAlert.created_at)
+    ).all()
+
+def mark_digest_sent(session: Session, feedback_ids: List[int]) -> None:
+    """Marks the rows as sent once the digest is out, so a failed send is retried with them. Commits."""
+    session.exec(
+        update(NegativeAlert)
+        .where(NegativeAlert.feedback_id.in_(feedback_ids), NegativeAlert.digest_sent_at == None)
+        .values(digest_sent_at=datetime.utcnow())
+    )
+    session.commit()
+
+def delete_negative_alert(session: Session, feedback_id: int) -> None:
+    """Drops the alert row with its feedback, so a reused id is alerted afresh. Caller commits."""
+    session.exec(delete(NegativeAlert).where(NegativeAlert.feedback_id == feedback_id))
+
+def purge_negative_alerts() -> int:
+    cutoff = datetime.utcnow() - ALERT_RETENTION
+    with Session(engine) as session:
+        result = session.exec(delete(NegativeAlert).where(NegativeAlert.created_at < cutoff))
+        session.commit()
+    return result.rowcount
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import update, and_, or_
+from sqlmodel import Session, select, func, delete
+
+from core.config import settings
+from core.database import engine
+from core.logger import get_logger
+from models import OutboxJob
+
+logger = get_logger(__name__)
+
+# kind -> async handler(payload). Handlers must raise on failure to get a retry.
+HANDLERS: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+# Kinds whose handler renders a PDF through services.reports.run_report
+REPORT_KINDS: Set[str] = set()
+
+def handler(kind: str, renders_report: bool = False):
+    def register(fn):
+        HANDLERS[kind] = fn
+        if renders_report:
+            REPORT_KINDS.add(kind)
+        return fn
+    return register
+
+
+@handler("whatsapp_message")
+async def _send_whatsapp(payload: dict) -> None:
+    from services.whatsapp_client import send_whatsapp_message
+    await send_whatsapp_message(payload["phone"], payload["message"], raise_errors=True)
+
+@handler("negative_alert", renders_report=True)
+async def _send_negative_alert(payload: dict) -> None:
+    from services.tasks import deliver_negative_report # tasks imports most services; keep it out of import time
+    await deliver_negative_report(payload["feedback_id"])
+
+@handler("negative_alert_digest", renders_report=True)
+async def _send_negative_digest(payload: dict) -> None:
+    from services.tasks import deliver_negative_digest
+    await deliver_negative_digest(payload["ro_code"])
+
+@handler("media_gc")
+async def _collect_media(payload: dict) -> None:
+    from services.media_store import collect_media_blobs
+    await asyncio.to_thread(collect_media_blobs, payload["keys"])
+
+
+# --- Producer side ---
+
+def enqueue(session, kind: str, payload: dict, delay_seconds: int = 0) -> OutboxJob:
+    """
+    Adds a job to the caller's session (sync or async) so it commits, or rolls
+    back, together with the write that caused it. Call wake() after committing.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown outbox job kind: {kind}")
+    job = OutboxJob(
+        kind=kind,
+        payload=json.dumps(payload),
+        max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+        available_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    session.add(job)
+    return job
+
+_wake_event: Optional[asyncio.Event] = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def wake() -> None:
+    """
+    Nudges an in-process worker to poll now instead of at its next interval.
+    Safe to call from threadpool endpoints as well as coroutines.
+    """
+    if _wake_event is not None and _worker_loop is not None:
+        _worker_loop.call_soon_threadsafe(_wake_event.set)
+
+
+# --- Worker side (sync DB helpers run in a thread) ---
+
+def _timeout_seconds(renders_report: bool) -> int:
+    # Report renders get REPORT_TIMEOUT_SECONDS on top, so the render's own deadline expires first
+    return settings.OUTBOX_JOB_TIMEOUT_SECONDS + (settings.REPORT_TIMEOUT_SECONDS if renders_report else 0)
+
+def job_timeout(kind: str) -> int:
+    """Seconds a job of this kind may run before it is cancelled (and retried)."""
+    return _timeout_seconds(kind in REPORT_KINDS)
+
+def _lock_timeout(renders_report: bool) -> timedelta:
+    # Past this, a running job's worker is presumed dead
+    return timedelta(seconds=_timeout_seconds(renders_report) * 2)
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with +/-20% jitter so failed jobs don't retry in lockstep."""
+    delay = min(settings.OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+def claim_jobs(worker_id: str, limit: int) -> list:
+    """
+    Claims up to limit due jobs for this worker. Each claim is a conditional
+    UPDATE (status still pending), so several worker processes can poll the
+    same table without running a job twice.
+    """
+    now = datetime.utcnow()
+    claimed = []
+    with Session(engine) as session:
+        # Requeue jobs whose worker died mid-run
+        session.exec(
+            update(OutboxJob)
+            .where(
+                OutboxJob.status == "running",
+                or_(
+                    and_(OutboxJob.kind.in_(REPORT_KINDS), OutboxJob.locked_at < now - _lock_timeout(True)),
+                    and_(OutboxJob.kind.not_in(REPORT_KINDS), OutboxJob.locked_at < now - _lock_timeout(False)),
+                ),
+            )
+            .values(status="pending", locked_by=None, locked_at=None)
+        )
+        candidates = session.exec(
+            select(OutboxJob.id)
+            .where(OutboxJob.status == "pending", OutboxJob.available_at <= now)
+            .order_by(OutboxJob.available_at)
+            .limit(limit)
+        ).all()
+        for job_id in candidates:
+            result = session.exec(
+                update(OutboxJob)
+                .where(OutboxJob.id == job_id, OutboxJob.status == "pending")
+                .values(status="running", locked_by=worker_id, locked_at=now, attempts=OutboxJob.attempts + 1)
+            )
+            if result.rowcount == 1:
+                claimed.append(job_id)
+        session.commit()
+        jobs = session.exec(select(OutboxJob).where(OutboxJob.id.in_(claimed))).all() if claimed else []
+        for job in jobs:
+            session.expunge(job)
+    return jobs
+
+def complete_job(job_id: int) -> None:
+    with Session(engine) as session:
+        job = session.get(OutboxJob, job_id)
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+        session.add(job)
+        session.commit()
+
+def fail_job(job_id: int, error: str) -> None:
+    """Schedules a retry with backoff, or marks the job dead once it is out of attempts."""
+    with Session(engine) as session:
+        job = session.get(OutboxJob, job_id)
+        job.last_error = error[:1000]
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = "dead"
+            job.finished_at = datetime.utcnow()
+            logger.error(f"Outbox job {job.id} ({job.kind}) is dead after {job.attempts} attempts: {error}")
+        else:
+            delay = backoff_seconds(job.attempts)
+            job.status = "pending"
+            job.available_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(f"Outbox job {job.id} ({job.kind}) failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error}")
+        session.add(job)
+        session.commit()
+
+def retry_job(session: Session, job_id: int) -> Optional[OutboxJob]:
+    """Puts a dead job back in the queue with a fresh set of attempts. Commits."""
+    job = session.get(OutboxJob, job_id)
+    if job is None or job.status != "dead":
+        return None
+    job.status = "pending"
+    job.attempts = 0
+    job.available_at = datetime.utcnow()
+    job.finished_at = None
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+def purge_outbox() -> int:
+    """Deletes done jobs older than OUTBOX_RETENTION_DAYS (dead jobs are kept for inspection)."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    with Session(engine) as session:
+        result = session.exec(delete(OutboxJob).where(OutboxJob.status == "done", OutboxJob.finished_at < cutoff))
+        session.commit()
+    return result.rowcount
+
+def outbox_stats(session: Session) -> dict:
+    counts = dict(session.exec(select(OutboxJob.status, func.count()).group_by(OutboxJob.status)).all())
+    oldest_pending = session.exec(select(func.min(OutboxJob.created_at)).where(OutboxJob.status == "pending")).first()
+    dead = session.exec(select(OutboxJob).where(OutboxJob.status == "dead").order_by(OutboxJob.id.desc()).limit(20)).all()
+    return {
+        "counts": {status: counts.get(status, 0) for status in ("pending", "running", "done", "dead")},
+        "oldestPendingAt": oldest_pending,
+        "recentDead": [
+            {"id": j.id, "kind": j.kind, "attempts": j.attempts, "lastError": j.last_error, "finishedAt": j.finished_at}
+            for j in dead
+        ],
+    }
+
+
+# --- Worker loop ---
+
+async def _run_job(job: OutboxJob, slots: asyncio.Semaphore) -> None:
+    try:
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise ValueError(f"No handler for outbox job kind {job.kind}")
+        await asyncio.wait_for(fn(json.loads(job.payload)), timeout=job_timeout(job.kind))
+        await asyncio.to_thread(complete_job, job.id)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        try:
+            await asyncio.to_thread(fail_job, job.id, error)
+        except Exception as db_error:
+            # The lock timeout will requeue it
+            logger.error(f"Could not record failure of outbox job {job.id}: {db_error}")
+    finally:
+        slots.release()
+
+async def run_worker(stop: Optional[asyncio.Event] = None) -> None:
+    """
+    Polls outbox_jobs and runs due jobs, at most OUTBOX_CONCURRENCY at a time.
+    Runs until stop is set (or the task is cancelled).
+    """
+    global _wake_event, _worker_loop
+    _wake_event = asyncio.Event()
+    _worker_loop = asyncio.get_running_loop()
+    stop = stop or asyncio.Event()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    slots = asyncio.Semaphore(settings.OUTBOX_CONCURRENCY)
+    running = set()
+    logger.info(f"Outbox worker {worker_id} started (concurrency {settings.OUTBOX_CONCURRENCY})")
+
+    try:
+        while not stop.is_set():
+            free = settings.OUTBOX_CONCURRENCY - len(running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await asyncio.to_thread(claim_jobs, worker_id, free)
+                except Exception as e:
+                    logger.error(f"Outbox poll failed: {e}")
+
+            for job in jobs:
+                await slots.acquire()
+                task = asyncio.create_task(_run_job(job, slots))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+            if len(jobs) < free or free == 0:
+                # Nothing more due right now: sleep until woken, stopped or the next poll
+                _wake_event.clear()
+                waiters = [asyncio.ensure_future(_wake_event.wait()), asyncio.ensure_future(stop.wait())]
+                await asyncio.wait(waiters, timeout=settings.OUTBOX_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                for w in waiters:
+                    w.cancel()
+    finally:
+        if running:
+            # Let in-flight jobs finish; anything cut off is requeued by the lock timeout
+            await asyncio.wait(running, timeout=settings.OUTBOX_JOB_TIMEOUT_SECONDS)
+        _wake_event = _worker_loop = None
+        logger.info(f"Outbox worker {worker_id} stopped")
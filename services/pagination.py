@@ -0,0 +1,78 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from sqlmodel import Session, select, func, tuple_
+
+from core.logger import get_logger
+from models import Feedback
+
+logger = get_logger(__name__)
+
+# Non-nullable Feedback columns that can key a cursor (NULLs break tuple comparison)
+KEYSET_SORT_FIELDS = {
+    "created_at", "id", "phone", "status", "workflow_status",
+    "feedback_method", "is_testimonial", "terms_accepted", "reviewed",
+}
+
+# Keyset ("cursor") pagination helpers. A cursor is an opaque token holding the
+# sort value and id of the last row of the previous page; the next page is the
+# rows strictly after (sort_value, id) in the requested order, so the database
+# seeks straight to it instead of skipping OFFSET rows.
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    raw = json.dumps([value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Returns (sort_value, id). Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if isinstance(value, dict) and "dt" in value:
+        value = datetime.fromisoformat(value["dt"])
+    if not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return value, row_id
+
+def apply_keyset(query, sort_col, cursor: Optional[str], descending: bool = True):
+    """
+    Orders the query by (sort_col, id) and, when a cursor is given, restricts it
+    to the rows after that cursor. sort_col must be non-nullable.
+    """
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        key = tuple_(sort_col, Feedback.id)
+        query = query.where(key < tuple_(value, row_id) if descending else key > tuple_(value, row_id))
+
+    if descending:
+        return query.order_by(sort_col.desc(), Feedback.id.desc())
+    return query.order_by(sort_col.asc(), Feedback.id.asc())
+
+def next_cursor(last_row, sort_field: str) -> str:
+    """Cursor pointing after the given Feedback row."""
+    return encode_cursor(getattr(last_row, sort_field), last_row.id)
+
+def estimate_count(session: Session, query) -> int:
+    """
+    Row estimate for a filtered select. On PostgreSQL this reads the planner's
+    estimate from EXPLAIN instead of counting; elsewhere (or if EXPLAIN fails)
+    it falls back to an exact COUNT.
+    """
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        try:
+            compiled = query.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+            plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}").scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            logger.warning(f"Count estimate failed, using exact count: {e}")
+    return session.exec(select(func.count()).select_from(query.subquery())).one()
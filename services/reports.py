@@ -0,0 +1,519 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import pickle
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+from fpdf import FPDF
+from sqlmodel import Session, select, func
+
+from core.config import settings
+from core.database import engine
+from core.logger import get_logger
+from models import AdminUser, Feedback, FeedbackMedia, UserROMapping
+from services.feedback_query import select_feedbacks, select_feedbacks_with_photo_flags, photo_flags, get_feedback
+from services.media_store import get_media_store, load_feedback_photo
+from services.thumbnails import get_or_create_thumbnail, render_thumbnail, is_thumbnailable
+
+logger = get_logger(__name__)
+
+REPORT_CHUNK_SIZE = 500 # Feedback rows fetched per round trip while building a report
+# Photos are drawn at 12x18 mm, so the smallest pre-generated thumbnail is plenty
+REPORT_THUMBNAIL_SIZE = 150
+REPORT_PHOTO_KINDS = ("air", "washroom", "receipt")
+
+
+class PDF(FPDF):
+    def header(self):
+        # Premium Header
+        self.set_fill_color(33, 37, 41) # Dark Background
+        self.rect(0, 0, 210, 30, 'F')
+        
+        self.set_y(10)
+        self.set_font('Helvetica', 'B', 18)
+        self.set_text_color(255, 255, 255) # White Text
+        self.cell(0, 10, 'Daily Feedback Report', 0, 1, 'C')
+        
+        self.set_font('Helvetica', 'I', 10)
+        self.set_text_color(200, 200, 200) # Light Gray
+        self.cell(0, 5, f"Generated on: {datetime.now().strftime('%B %d, %Y at %H:%M')}", 0, 1, 'C')
+        self.ln(15)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Helvetica', 'I', 8)
+        self.set_text_color(128)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+    def table_header(self):
+        self.set_font('Helvetica', 'B', 9)
+        self.set_fill_color(233, 236, 239) # Header Gray
+        self.set_text_color(33, 37, 41)
+        self.set_draw_color(222, 226, 230)
+        self.set_line_width(0.3)
+        
+        # Column Widths
+        self.w_time = 25
+        self.w_ro = 25
+        self.w_method = 20 # New Column
+        self.w_phone = 30
+        self.w_rating = 20
+        self.w_comment = 30 # Reduced to fit Method
+        self.w_photos = 40
+        
+        self.cell(self.w_time, 8, 'Time', 1, 0, 'C', 1)
+        self.cell(self.w_ro, 8, 'RO #', 1, 0, 'C', 1)
+        self.cell(self.w_method, 8, 'Method', 1, 0, 'C', 1) # New Header
+        self.cell(self.w_phone, 8, 'Phone', 1, 0, 'C', 1)
+        self.cell(self.w_rating, 8, 'Ratings', 1, 0, 'C', 1)
+        self.cell(self.w_comment, 8, 'Comment', 1, 0, 'C', 1)
+        self.cell(self.w_photos, 8, 'Photos', 1, 1, 'C', 1)
+
+    def table_row(self, feedback, fill, photos=None):
+        self.set_font('Helvetica', '', 8)
+        self.set_text_color(50, 50, 50)
+        self.set_fill_color(248, 249, 250) if fill else self.set_fill_color(255, 255, 255)
+        
+        # Calculate height based on comment length
+        # Standard height is 15, but comment might expand it
+        # MultiCell simulation to get height
+        x_start = self.get_x()
+        y_start = self.get_y()
+        
+        # Ratings String
+        air_rating = f"Air: {feedback.rating_air}/3" if feedback.rating_air else "Air: -"
+        wash_rating = f"W/R: {feedback.rating_washroom}/3" if feedback.rating_washroom else "W/R: -"
+        ratings_text = f"{air_rating}\n{wash_rating}"
+        
+        # Determine Row Height (Max of content)
+        # We'll fix it to 20mm for compactness and consistency with thumbnails
+        row_height = 20
+        
+        # Check for page break
+        if y_start + row_height > 270:
+            self.add_page()
+            self.table_header()
+            y_start = self.get_y()
+            x_start = self.get_x()
+
+        # Draw Cells
+        # Time
+        self.cell(self.w_time, row_height, feedback.created_at.strftime('%H:%M'), 1, 0, 'C', fill)
+        
+        # RO Number
+        ro_text = feedback.ro_number if feedback.ro_number else "-"
+        self.cell(self.w_ro, row_height, ro_text, 1, 0, 'C', fill)
+
+        # Method
+        method_text = feedback.feedback_method if feedback.feedback_method else "-"
+        self.cell(self.w_method, row_height, method_text, 1, 0, 'C', fill)
+        
+        # Phone
+        self.cell(self.w_phone, row_height, feedback.phone, 1, 0, 'C', fill)
+        
+        # Ratings (MultiLine)
+        x_rating = self.get_x()
+        self.cell(self.w_rating, row_height, "", 1, 0, 'C', fill) # Border only
+        self.set_xy(x_rating, y_start)
+        self.multi_cell(self.w_rating, row_height/2, ratings_text, 0, 'C')
+        self.set_xy(x_rating + self.w_rating, y_start)
+        
+        # Comment (MultiLine)
+        x_comment = self.get_x()
+        self.cell(self.w_comment, row_height, "", 1, 0, 'L', fill) # Border only
+        self.set_xy(x_comment, y_start)
+        # Truncate comment if too long for fixed height? Or just let it clip?
+        # Let's use multi_cell with a small font
+        comment_text = feedback.comment or "-"
+        self.set_font('Helvetica', '', 7)
+        self.multi_cell(self.w_comment, 4, comment_text, 0, 'L')
+        self.set_font('Helvetica', '', 8)
+        self.set_xy(x_comment + self.w_comment, y_start)
+        
+        # Photos
+        x_photos = self.get_x()
+        self.cell(self.w_photos, row_height, "", 1, 1, 'C', fill) # Border and new line
+        
+        # Add Thumbnails
+        # We have 3 slots in 40mm width -> ~12mm each
+        # Height 20mm -> max img height ~18mm
+        
+        def add_thumb(img_bytes, offset_x):
+            if img_bytes:
+                try:
+                    img_stream = io.BytesIO(img_bytes)
+                    # Fit in 12x18 box
+                    self.image(img_stream, x=x_photos + offset_x, y=y_start + 1, w=12, h=18)
+                except Exception:
+                    pass
+
+        photos = photos or {}
+        add_thumb(photos.get("air"), 1)
+        add_thumb(photos.get("washroom"), 14)
+        add_thumb(photos.get("receipt"), 27)
+
+def _write_summary(pdf: PDF, total: int, avg_air: Optional[float], avg_wash: Optional[float], label: Optional[str] = None) -> None:
+    pdf.set_font("Helvetica", 'B', 12)
+    pdf.set_text_color(33, 37, 41)
+    pdf.cell(0, 8, f"Summary Overview", 0, 1)
+    if label:
+        pdf.set_font("Helvetica", 'I', 10)
+        pdf.multi_cell(0, 6, label, 0, 'L')
+    pdf.set_font("Helvetica", '', 10)
+    pdf.cell(50, 6, f"Total Feedback: {total}", 0, 0)
+    pdf.cell(50, 6, f"Avg Air Rating: {avg_air or 0:.1f}/3", 0, 0)
+    pdf.cell(50, 6, f"Avg Washroom Rating: {avg_wash or 0:.1f}/3", 0, 1)
+    pdf.ln(5)
+
+def _new_report(total: int, avg_air: Optional[float], avg_wash: Optional[float], label: Optional[str] = None) -> PDF:
+    pdf = PDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    _write_summary(pdf, total, avg_air, avg_wash, label)
+    pdf.table_header()
+    return pdf
+
+def report_thumbnails(session: Session, feedbacks: Iterable[Feedback], has_photo: Optional[Dict[int, dict]] = None,
+                      size: int = REPORT_THUMBNAIL_SIZE) -> Dict[int, dict]:
+    """
+    {feedback_id: {kind: JPEG bytes}} of the thumbnails drawn in report rows
+    (or embedded in alert emails, with a larger size), from the media store's
+    cached variants (rendered on a miss). Rows not
+    yet backfilled are thumbnailed from their photo_* column; pass has_photo
+    ({feedback_id: {kind: bool}}) to only load the columns that hold a photo.
+    """
+    feedbacks = list(feedbacks)
+    if not feedbacks:
+        return {}
+    store = get_media_store()
+    media_rows = session.exec(
+        select(FeedbackMedia).where(
+            FeedbackMedia.feedback_id.in_([f.id for f in feedbacks]),
+            FeedbackMedia.kind.in_(REPORT_PHOTO_KINDS),
+        )
+    ).all()
+    media = {(m.feedback_id, m.kind): m.sha256 for m in media_rows}
+
+    thumbnails = {}
+    for feedback in feedbacks:
+        photos = {}
+        for kind in REPORT_PHOTO_KINDS:
+            try:
+                key = media.get((feedback.id, kind))
+                if key:
+                    thumb = get_or_create_thumbnail(key, partial(store.get, key), size, "jpeg")
+                elif has_photo is None or has_photo[feedback.id][kind]:
+                    data = load_feedback_photo(session, feedback, kind)
+                    thumb = render_thumbnail(data, size, "jpeg") if data and is_thumbnailable(data) else None
+                else:
+                    thumb = None
+            except Exception as e:
+                # A broken photo leaves an empty slot rather than failing the report
+                logger.warning(f"No report thumbnail for feedback {feedback.id} ({kind}): {e}")
+                thumb = None
+            if thumb:
+                photos[kind] = thumb
+        thumbnails[feedback.id] = photos
+    return thumbnails
+
+def generate_pdf(feedbacks, photos=None) -> bytes:
+    """PDF report of an in-memory list of feedback. photos: optional {feedback_id: {kind: bytes}} used for row thumbnails."""
+    photos = photos or {}
+    air_ratings = [f.rating_air for f in feedbacks if f.rating_air]
+    wash_ratings = [f.rating_washroom for f in feedbacks if f.rating_washroom]
+    avg_air = sum(air_ratings)/len(air_ratings) if air_ratings else 0
+    avg_wash = sum(wash_ratings)/len(wash_ratings) if wash_ratings else 0
+
+    pdf = _new_report(len(feedbacks), avg_air, avg_wash)
+    fill = False
+    for feedback in feedbacks:
+        pdf.table_row(feedback, fill, photos.get(feedback.id))
+        fill = not fill # Toggle zebra striping
+    return bytes(pdf.output())
+
+def build_feedback_report(session: Session, start: datetime, end: Optional[datetime] = None) -> Optional[bytes]:
+    """
+    PDF report of feedback created in [start, end), or None if there is
+    none. The summary comes from SQL
+    aggregates and rows are read REPORT_CHUNK_SIZE at a time with their
+    thumbnails, so memory depends on the chunk size and not on the day's volume.
+    """
+    conditions = [Feedback.created_at >= start]
+    if end is not None:
+        conditions.append(Feedback.created_at < end)
+
+    total, avg_air, avg_wash = session.exec(
+        select(func.count(Feedback.id), func.avg(Feedback.rating_air), func.avg(Feedback.rating_washroom)).where(*conditions)
+    ).one()
+    if not total:
+        return None
+
+    pdf = _new_report(total, avg_air, avg_wash)
+    query = (
+        select_feedbacks_with_photo_flags()
+        .where(*conditions)
+        .order_by(Feedback.created_at, Feedback.id)
+        .execution_options(yield_per=REPORT_CHUNK_SIZE)
+    )
+    fill = False
+    for chunk in session.exec(query).partitions():
+        feedbacks = [row[0] for row in chunk]
+        thumbnails = report_thumbnails(session, feedbacks, {row[0].id: photo_flags(row) for row in chunk})
+        for feedback in feedbacks:
+            pdf.table_row(feedback, fill, thumbnails.get(feedback.id))
+            fill = not fill # Toggle zebra striping
+        # Rows already drawn don't need to stay in the identity map
+        for feedback in feedbacks:
+            session.expunge(feedback)
+    return bytes(pdf.output())
+
+
+# --- Per-scope fan-out ---
+# Hierarchy users get a report of just their ROs. An RO usually sits in a DO's,
+# a DRSM's and an SRH's scope, so each RO's rows and thumbnails are read once
+# into a section file that every scope report containing it draws from.
+
+REPORT_SCOPE_ROLES = ("SRH", "DRSM", "DO")
+# Excel onboarding fills in <username>@example.com when a user has no address
+PLACEHOLDER_EMAIL_DOMAIN = "@example.com"
+
+
+class ReportRow(NamedTuple):
+    """The columns a report row draws (PDF.table_row reads them as attributes)."""
+    id: int
+    created_at: datetime
+    ro_number: Optional[str]
+    feedback_method: Optional[str]
+    phone: str
+    rating_air: Optional[int]
+    rating_washroom: Optional[int]
+    comment: Optional[str]
+
+    @classmethod
+    def from_feedback(cls, feedback: Feedback) -> "ReportRow":
+        return cls(*(getattr(feedback, field) for field in cls._fields))
+
+
+@dataclass
+class ReportScope:
+    """One scoped report: its RO codes (None = all) and who receives it."""
+    labels: List[str]
+    ro_codes: Optional[FrozenSet[str]]
+    recipients: List[str]
+
+    @property
+    def label(self) -> str:
+        return ", ".join(self.labels)
+
+def plan_report_scopes(session: Session) -> List[ReportScope]:
+    """
+    One scope per distinct RO set among active SRH/DRSM/DO users with a real
+    email address; users whose mappings are identical share a report.
+    """
+    rows = session.exec(
+        select(AdminUser.username, AdminUser.role, AdminUser.email, UserROMapping.ro_code)
+        .join(UserROMapping, UserROMapping.username == AdminUser.username)
+        .where(AdminUser.role.in_(REPORT_SCOPE_ROLES), AdminUser.is_active == True)
+    ).all()
+    users: Dict[tuple, set] = {}
+    for username, role, email, ro_code in rows:
+        users.setdefault((username, role, email), set()).add(ro_code)
+
+    scopes: Dict[FrozenSet[str], ReportScope] = {}
+    for (username, role, email), ro_codes in sorted(users.items()):
+        if not email or email.lower().endswith(PLACEHOLDER_EMAIL_DOMAIN):
+            continue
+        key = frozenset(ro_codes)
+        if key in scopes:
+            scopes[key].labels.append(f"{role} {username}")
+            scopes[key].recipients.append(email)
+        else:
+            scopes[key] = ReportScope(labels=[f"{role} {username}"], ro_codes=key, recipients=[email])
+    return list(scopes.values())
+
+def scope_sections(scope: ReportScope, manifest: Dict[str, dict]) -> List[dict]:
+    """The scope's section entries from prepare_ro_sections, in RO order (empty if none of its ROs had feedback)."""
+    codes = manifest.keys() if scope.ro_codes is None else scope.ro_codes
+    return [manifest[code] for code in sorted(codes) if code in manifest]
+
+class _SectionWriter:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest: Dict[str, dict] = {}
+        self.ro_code: Optional[str] = None
+        self.rows: List[ReportRow] = []
+        self.thumbnails: List[dict] = []
+        self.files = 0
+
+    def add(self, ro_code: str, row: ReportRow, thumbnails: dict) -> None:
+        if ro_code != self.ro_code:
+            self.flush()
+            self.ro_code = ro_code
+        self.rows.append(row)
+        self.thumbnails.append(thumbnails)
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        path = os.path.join(self.directory, f"section-{self.files}.pkl")
+        self.files += 1
+        with open(path, "wb") as f:
+            pickle.dump({"rows": self.rows, "thumbnails": self.thumbnails}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        air = [r.rating_air for r in self.rows if r.rating_air]
+        wash = [r.rating_washroom for r in self.rows if r.rating_washroom]
+        # An RO seen again (rows not contiguous in the sort) gets a second file rather than replacing the first
+        entry = self.manifest.setdefault(
+            self.ro_code, {"paths": [], "count": 0, "air_sum": 0, "air_n": 0, "wash_sum": 0, "wash_n": 0}
+        )
+        entry["paths"].append(path)
+        entry["count"] += len(self.rows)
+        entry["air_sum"] += sum(air)
+        entry["air_n"] += len(air)
+        entry["wash_sum"] += sum(wash)
+        entry["wash_n"] += len(wash)
+        self.rows, self.thumbnails = [], []
+
+def _section_key(column):
+    """SQL form of the section key (ro_number or "-"), so NULL and "" sort as one group on every backend."""
+    return func.coalesce(func.nullif(column, ""), "-")
+
+def prepare_ro_sections(directory: str, start: datetime, end: Optional[datetime] = None) -> Dict[str, dict]:
+    """
+    Worker entry point: a single chunked pass over feedback in [start, end),
+    ordered by RO, that writes each RO's rows and thumbnails to its own file in
+    directory. Returns {ro_code: {"paths", "count", rating sums}}; rows without
+    an RO (NULL or "") are filed under "-".
+    """
+    conditions = [Feedback.created_at >= start]
+    if end is not None:
+        conditions.append(Feedback.created_at < end)
+    query = (
+        select_feedbacks_with_photo_flags()
+        .where(*conditions)
+        .order_by(_section_key(Feedback.ro_number), Feedback.created_at, Feedback.id)
+        .execution_options(yield_per=REPORT_CHUNK_SIZE)
+    )
+    writer = _SectionWriter(directory)
+    with Session(engine) as session:
+        for chunk in session.exec(query).partitions():
+            feedbacks = [row[0] for row in chunk]
+            thumbnails = report_thumbnails(session, feedbacks, {row[0].id: photo_flags(row) for row in chunk})
+            for feedback in feedbacks:
+                writer.add(feedback.ro_number or "-", ReportRow.from_feedback(feedback), thumbnails.get(feedback.id) or {})
+                session.expunge(feedback)
+    writer.flush()
+    return writer.manifest
+
+def render_scope_report(label: str, sections: List[dict]) -> bytes:
+    """Worker entry point: draws the given RO sections into one PDF report."""
+    total = sum(s["count"] for s in sections)
+    air_n = sum(s["air_n"] for s in sections)
+    wash_n = sum(s["wash_n"] for s in sections)
+    avg_air = sum(s["air_sum"] for s in sections) / air_n if air_n else 0
+    avg_wash = sum(s["wash_sum"] for s in sections) / wash_n if wash_n else 0
+
+    pdf = _new_report(total, avg_air, avg_wash, f"{label} - {len(sections)} RO(s) with feedback")
+    fill = False
+    for section in sections:
+        for path in section["paths"]:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            for row, photos in zip(data["rows"], data["thumbnails"]):
+                pdf.table_row(row, fill, photos)
+                fill = not fill # Toggle zebra striping
+    return bytes(pdf.output())
+
+
+# --- Rendering off the event loop ---
+# fpdf2 and thumbnail decoding are CPU-bound, so reports are rendered in worker
+# processes that open their own DB session; ids and dates go in, PDF bytes come back.
+
+def render_daily_report(start: datetime, end: Optional[datetime] = None) -> Optional[bytes]:
+    """Worker entry point for build_feedback_report."""
+    with Session(engine) as session:
+        return build_feedback_report(session, start, end)
+
+def render_feedback_pdf(feedback_id: int) -> Optional[bytes]:
+    """Worker entry point for a single-feedback report. None if the feedback no longer exists."""
+    with Session(engine) as session:
+        feedback = get_feedback(session, feedback_id)
+        if not feedback:
+            return None
+        return generate_pdf([feedback], report_thumbnails(session, [feedback]))
+
+def render_feedbacks_pdf(feedback_ids: List[int]) -> Optional[bytes]:
+    """Worker entry point for a report of the given feedback (alert digests). None if none of them exist."""
+    with Session(engine) as session:
+        feedbacks = session.exec(
+            select_feedbacks().where(Feedback.id.in_(feedback_ids)).order_by(Feedback.created_at, Feedback.id)
+        ).all()
+        if not feedbacks:
+            return None
+        return generate_pdf(feedbacks, report_thumbnails(session, feedbacks))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that holds the event loop, DB pools and scheduler threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=settings.REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+class _RenderExpired(BaseException):
+    # BaseException so the render's own "except Exception" handlers can't swallow it
+    pass
+
+def _expire_render(signum, frame):
+    raise _RenderExpired()
+
+def _render_with_deadline(fn: Callable, seconds: float, *args):
+    """
+    Runs in a report worker: fails this render with TimeoutError once it has
+    run for seconds, leaving the worker process free for the next render.
+    """
+    if not hasattr(signal, "setitimer"): # Windows: no interval timer, the caller's timeout still applies
+        return fn(*args)
+    previous = signal.signal(signal.SIGALRM, _expire_render)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return fn(*args)
+    except _RenderExpired:
+        raise TimeoutError(f"Report render {fn.__name__} ran longer than {seconds}s") from None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def shutdown_report_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+async def run_report(fn: Callable, *args):
+    """
+    Runs a render_* function in the report process pool (or on a thread when
+    REPORT_WORKERS is 0) and awaits its result, so the event loop keeps
+    serving requests. Raises TimeoutError after REPORT_TIMEOUT_SECONDS.
+
+    Only this render is given up on a timeout: a queued render is dropped and
+    a running one is stopped by its worker's own deadline, so other renders
+    in the pool carry on.
+    """
+    timeout = settings.REPORT_TIMEOUT_SECONDS
+    if settings.REPORT_WORKERS <= 0:
+        return await asyncio.wait_for(asyncio.to_thread(fn, *args), timeout=timeout)
+
+    future = asyncio.get_running_loop().run_in_executor(_get_pool(), _render_with_deadline, fn, timeout, *args)
+    try:
+        # Cancelling the wait (timeout, outbox job cancelled) also drops the render if it hasn't started
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Report render {fn.__name__} timed out after {timeout}s")
+        raise
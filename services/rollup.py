@@ -0,0 +1,71 @@
+from typing import Optional, Tuple
+
+from sqlmodel import Session, select, func, delete, update, insert
+
+from core.logger import get_logger
+from models import Feedback, FeedbackDailyRollup
+
+logger = get_logger(__name__)
+
+# Columns that identify a rollup bucket, in rollup_key() order
+KEY_FIELDS = ("day", "ro_number", "status", "rating_air", "rating_washroom", "rating_water")
+
+
+def rollup_key(feedback: Feedback) -> Tuple:
+    """The rollup bucket a feedback row currently counts towards."""
+    return (
+        feedback.created_at.date(),
+        feedback.ro_number,
+        feedback.status,
+        feedback.rating_air,
+        feedback.rating_washroom,
+        feedback.rating_water,
+    )
+
+def adjust_rollup(session: Session, key: Tuple, delta: int) -> None:
+    """Atomically adds delta to the bucket's count, creating the bucket if needed."""
+    conditions = [getattr(FeedbackDailyRollup, f) == v for f, v in zip(KEY_FIELDS, key)]
+    result = session.exec(
+        update(FeedbackDailyRollup).where(*conditions).values(count=FeedbackDailyRollup.count + delta)
+    )
+    if result.rowcount == 0:
+        session.add(FeedbackDailyRollup(**dict(zip(KEY_FIELDS, key)), count=delta))
+
+def record_feedback_change(session: Session, before: Optional[Tuple], after: Optional[Tuple]) -> None:
+    """
+    Moves a feedback between rollup buckets. Pass before=None for a new
+    feedback and after=None for a deleted one. Caller commits.
+    """
+    if before == after:
+        return
+    if before is not None:
+        adjust_rollup(session, before, -1)
+    if after is not None:
+        adjust_rollup(session, after, 1)
+
+def rebuild_rollup(session: Session) -> None:
+    """Recomputes the whole rollup table from the feedback table."""
+    day = func.date(Feedback.created_at)
+    source = select(
+        day,
+        Feedback.ro_number,
+        Feedback.status,
+        Feedback.rating_air,
+        Feedback.rating_washroom,
+        Feedback.rating_water,
+        func.count(Feedback.id),
+    ).group_by(
+        day, Feedback.ro_number, Feedback.status,
+        Feedback.rating_air, Feedback.rating_washroom, Feedback.rating_water,
+    )
+    session.exec(delete(FeedbackDailyRollup))
+    session.exec(insert(FeedbackDailyRollup).from_select(list(KEY_FIELDS) + ["count"], source))
+    session.commit()
+
+def ensure_rollup(session: Session) -> None:
+    """Builds the rollup on first start (or after it was cleared) if feedback exists."""
+    has_rollup = session.exec(select(FeedbackDailyRollup.id).limit(1)).first()
+    has_feedback = session.exec(select(Feedback.id).limit(1)).first()
+    if has_feedback and not has_rollup:
+        logger.info("Feedback rollup is empty. Rebuilding from feedback table.")
+        rebuild_rollup(session)
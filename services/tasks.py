@@ -1,15 +1,27 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlmodel import Session, select
+from sqlmodel import Session
 from datetime import datetime, timedelta
-from fpdf import FPDF
+from fastapi import UploadFile
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+from starlette.datastructures import Headers
 from core.database import engine
 from models import Feedback
+from services.feedback_query import get_feedback, select_feedbacks
+from services.reports import (
+    run_report, render_daily_report, render_feedback_pdf, ReportScope, plan_report_scopes,
+    prepare_ro_sections, render_scope_report, scope_sections, render_feedbacks_pdf, report_thumbnails,
+)
+from services.negative_alerts import pending_digest_ids, mark_digest_sent, purge_negative_alerts
+from services.export_jobs import cleanup_export_jobs, heartbeat_export_jobs
+from services.media_ingest import normalize_pending_media
+from services.outbox import purge_outbox
 from core.config import settings
 from core.logger import get_logger
-import os
 import base64
+from html import escape
 import io
+import asyncio
+import tempfile
 
 logger = get_logger(__name__)
 scheduler = AsyncIOScheduler()
@@ -33,183 +45,38 @@ if settings.MAIL_USERNAME and settings.MAIL_PASSWORD and settings.MAIL_FROM and
 else:
     logger.warning("Email configuration missing. Email reports will be disabled.")
 
-class PDF(FPDF):
-    def header(self):
-        # Premium Header
-        self.set_fill_color(33, 37, 41) # Dark Background
-        self.rect(0, 0, 210, 30, 'F')
-        
-        self.set_y(10)
-        self.set_font('Helvetica', 'B', 18)
-        self.set_text_color(255, 255, 255) # White Text
-        self.cell(0, 10, 'Daily Feedback Report', 0, 1, 'C')
-        
-        self.set_font('Helvetica', 'I', 10)
-        self.set_text_color(200, 200, 200) # Light Gray
-        self.cell(0, 5, f"Generated on: {datetime.now().strftime('%B %d, %Y at %H:%M')}", 0, 1, 'C')
-        self.ln(15)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Helvetica', 'I', 8)
-        self.set_text_color(128)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-    def table_header(self):
-        self.set_font('Helvetica', 'B', 9)
-        self.set_fill_color(233, 236, 239) # Header Gray
-        self.set_text_color(33, 37, 41)
-        self.set_draw_color(222, 226, 230)
-        self.set_line_width(0.3)
-        
-        # Column Widths
-        self.w_time = 25
-        self.w_ro = 25
-        self.w_method = 20 # New Column
-        self.w_phone = 30
-        self.w_rating = 20
-        self.w_comment = 30 # Reduced to fit Method
-        self.w_photos = 40
-        
-        self.cell(self.w_time, 8, 'Time', 1, 0, 'C', 1)
-        self.cell(self.w_ro, 8, 'RO #', 1, 0, 'C', 1)
-        self.cell(self.w_method, 8, 'Method', 1, 0, 'C', 1) # New Header
-        self.cell(self.w_phone, 8, 'Phone', 1, 0, 'C', 1)
-        self.cell(self.w_rating, 8, 'Ratings', 1, 0, 'C', 1)
-        self.cell(self.w_comment, 8, 'Comment', 1, 0, 'C', 1)
-        self.cell(self.w_photos, 8, 'Photos', 1, 1, 'C', 1)
-
-    def table_row(self, feedback, fill):
-        self.set_font('Helvetica', '', 8)
-        self.set_text_color(50, 50, 50)
-        self.set_fill_color(248, 249, 250) if fill else self.set_fill_color(255, 255, 255)
-        
-        # Calculate height based on comment length
-        # Standard height is 15, but comment might expand it
-        # MultiCell simulation to get height
-        x_start = self.get_x()
-        y_start = self.get_y()
-        
-        # Ratings String
-        air_rating = f"Air: {feedback.rating_air}/3" if feedback.rating_air else "Air: -"
-        wash_rating = f"W/R: {feedback.rating_washroom}/3" if feedback.rating_washroom else "W/R: -"
-        ratings_text = f"{air_rating}\n{wash_rating}"
-        
-        # Determine Row Height (Max of content)
-        # We'll fix it to 20mm for compactness and consistency with thumbnails
-        row_height = 20
-        
-        # Check for page break
-        if y_start + row_height > 270:
-            self.add_page()
-            self.table_header()
-            y_start = self.get_y()
-            x_start = self.get_x()
-
-        # Draw Cells
-        # Time
-        self.cell(self.w_time, row_height, feedback.created_at.strftime('%H:%M'), 1, 0, 'C', fill)
-        
-        # RO Number
-        ro_text = feedback.ro_number if feedback.ro_number else "-"
-        self.cell(self.w_ro, row_height, ro_text, 1, 0, 'C', fill)
-
-        # Method
-        method_text = feedback.feedback_method if feedback.feedback_method else "-"
-        self.cell(self.w_method, row_height, method_text, 1, 0, 'C', fill)
-        
-        # Phone
-        self.cell(self.w_phone, row_height, feedback.phone, 1, 0, 'C', fill)
-        
-        # Ratings (MultiLine)
-        x_rating = self.get_x()
-        self.cell(self.w_rating, row_height, "", 1, 0, 'C', fill) # Border only
-        self.set_xy(x_rating, y_start)
-        self.multi_cell(self.w_rating, row_height/2, ratings_text, 0, 'C')
-        self.set_xy(x_rating + self.w_rating, y_start)
-        
-        # Comment (MultiLine)
-        x_comment = self.get_x()
-        self.cell(self.w_comment, row_height, "", 1, 0, 'L', fill) # Border only
-        self.set_xy(x_comment, y_start)
-        # Truncate comment if too long for fixed height? Or just let it clip?
-        # Let's use multi_cell with a small font
-        comment_text = feedback.comment or "-"
-        self.set_font('Helvetica', '', 7)
-        self.multi_cell(self.w_comment, 4, comment_text, 0, 'L')
-        self.set_font('Helvetica', '', 8)
-        self.set_xy(x_comment + self.w_comment, y_start)
-        
-        # Photos
-        x_photos = self.get_x()
-        self.cell(self.w_photos, row_height, "", 1, 1, 'C', fill) # Border and new line
-        
-        # Add Thumbnails
-        # We have 3 slots in 40mm width -> ~12mm each
-        # Height 20mm -> max img height ~18mm
-        
-        def add_thumb(img_bytes, offset_x):
-            if img_bytes:
-                try:
-                    img_stream = io.BytesIO(img_bytes)
-                    # Fit in 12x18 box
-                    self.image(img_stream, x=x_photos + offset_x, y=y_start + 1, w=12, h=18)
-                except Exception:
-                    pass
-
-        add_thumb(feedback.photo_air, 1)
-        add_thumb(feedback.photo_washroom, 14)
-        add_thumb(feedback.photo_receipt, 27)
-
-def generate_pdf(feedbacks, filename):
-    pdf = PDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
-    # Summary Section
-    pdf.set_font("Helvetica", 'B', 12)
-    pdf.set_text_color(33, 37, 41)
-    
-    total = len(feedbacks)
-    # Calculate averages ignoring None
-    air_ratings = [f.rating_air for f in feedbacks if f.rating_air]
-    wash_ratings = [f.rating_washroom for f in feedbacks if f.rating_washroom]
-    
-    avg_air = sum(air_ratings)/len(air_ratings) if air_ratings else 0
-    avg_wash = sum(wash_ratings)/len(wash_ratings) if wash_ratings else 0
-    
-    pdf.cell(0, 8, f"Summary Overview", 0, 1)
-    pdf.set_font("Helvetica", '', 10)
-    pdf.cell(50, 6, f"Total Feedback: {total}", 0, 0)
-    pdf.cell(50, 6, f"Avg Air Rating: {avg_air:.1f}/3", 0, 0)
-    pdf.cell(50, 6, f"Avg Washroom Rating: {avg_wash:.1f}/3", 0, 1)
-    pdf.ln(5)
-    
-    # Table Header
-    pdf.table_header()
-    
-    # Rows
-    fill = False
-    for feedback in feedbacks:
-        pdf.table_row(feedback, fill)
-        fill = not fill # Toggle zebra striping
-        
-    pdf.output(filename)
-
-async def send_email_report(filename):
+# Photos embedded in alert emails: large enough to judge, a fraction of the original's size
+EMAIL_PHOTO_SIZE = 640
+
+def load_report_photos(session: Session, feedback: Feedback) -> dict:
+    """Loads the photos embedded in alert emails ({kind: JPEG bytes}) as cached thumbnails."""
+    return report_thumbnails(session, [feedback], size=EMAIL_PHOTO_SIZE)[feedback.id]
+
+def mail_to_recipients() -> list:
+    # Support multiple recipients (comma-separated)
+    return [email.strip() for email in settings.MAIL_TO.split(',')] if settings.MAIL_TO else []
+
+def pdf_attachment(data: bytes, filename: str) -> UploadFile:
+    """Attaches PDF bytes straight from memory; nothing is written to disk."""
+    return UploadFile(file=io.BytesIO(data), filename=filename, headers=Headers({"content-type": "application/pdf"}))
+
+def report_filename(prefix: str) -> str:
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+async def send_email_report(pdf: bytes, recipients=None):
+    """Mails a report PDF to recipients (default: MAIL_TO)."""
     if not conf:
         logger.warning("Email configuration missing. Skipping email report.")
         return
 
-    # Support multiple recipients (comma-separated)
-    recipients = [email.strip() for email in settings.MAIL_TO.split(',')] if settings.MAIL_TO else []
+    recipients = recipients if recipients is not None else mail_to_recipients()
     
     message = MessageSchema(
         subject="Daily Feedback Report",
         recipients=recipients, 
         body="Attached is the daily feedback report.",
         subtype=MessageType.html,
-        attachments=[filename]
+        attachments=[pdf_attachment(pdf, report_filename("report"))]
     )
     # Update conf to use MAIL_FROM_NAME if supported by fastapi-mail or just rely on MAIL_FROM
     # fastapi-mail ConnectionConfig doesn't directly take MAIL_FROM_NAME in older versions, 
@@ -218,34 +85,70 @@ async def send_email_report(filename):
     fm = FastMail(conf)
     await fm.send_message(message)
 
+async def send_scoped_reports(since: datetime):
+    """
+    Fan-out daily report: every SRH/DRSM/DO scope gets a PDF of its own ROs and
+    MAIL_TO gets the full report. RO sections are prepared once, then the
+    scope PDFs are rendered in parallel report workers and mailed as each finishes.
+    """
+    if not conf:
+        logger.warning("Email configuration missing. Skipping scoped reports.")
+        return
+    with Session(engine) as session:
+        scopes = plan_report_scopes(session)
+    if settings.MAIL_TO:
+        scopes.append(ReportScope(labels=["All ROs"], ro_codes=None, recipients=mail_to_recipients()))
+
+    # Section files only; the PDFs themselves never touch the disk
+    with tempfile.TemporaryDirectory(prefix="report-", dir=settings.REPORT_TMP_DIR) as workdir:
+        manifest = await run_report(prepare_ro_sections, workdir, since)
+        if not manifest:
+            logger.info("No feedback to report.")
+            return
+        scopes = [scope for scope in scopes if scope_sections(scope, manifest)]
+
+        # Queued renders would otherwise count pool wait time against REPORT_TIMEOUT_SECONDS
+        slots = asyncio.Semaphore(max(1, settings.REPORT_WORKERS))
+
+        async def deliver(scope: ReportScope):
+            async with slots:
+                pdf = await run_report(render_scope_report, scope.label, scope_sections(scope, manifest))
+            await send_email_report(pdf, scope.recipients)
+            logger.info(f"Report for {scope.label} ({len(pdf)} bytes) sent to {len(scope.recipients)} recipient(s)")
+
+        results = await asyncio.gather(*(deliver(scope) for scope in scopes), return_exceptions=True)
+        failed = [(scope, result) for scope, result in zip(scopes, results) if isinstance(result, Exception)]
+        for scope, error in failed:
+            logger.error(f"Failed to deliver report for {scope.label}: {error}")
+        logger.info(f"Scoped reports: {len(scopes) - len(failed)} sent, {len(failed)} failed, {len(manifest)} ROs with feedback")
+
 async def generate_daily_report():
     logger.info(f"Generating daily report for {datetime.now()}")
     try:
-        with Session(engine) as session:
-            # Fetch feedback for the last interval (e.g., last 24 hours)
-            time_threshold = datetime.utcnow() - timedelta(minutes=settings.REPORT_INTERVAL_MINUTES)
-            statement = select(Feedback).where(Feedback.created_at >= time_threshold)
-            feedbacks = session.exec(statement).all()
-            
-            if feedbacks:
-                filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                generate_pdf(feedbacks, filename)
-                try:
-                    await send_email_report(filename)
-                    logger.info(f"Report sent to {settings.MAIL_TO}")
-                except Exception as e:
-                    logger.error(f"Failed to send email: {e}")
-                finally:
-                    if os.path.exists(filename):
-                        os.remove(filename)
-            else:
-                logger.info("No feedback to report.")
+        # Feedback for the last interval (e.g., last 24 hours)
+        time_threshold = datetime.utcnow() - timedelta(minutes=settings.REPORT_INTERVAL_MINUTES)
+        if settings.REPORT_FANOUT:
+            await send_scoped_reports(time_threshold)
+            return
+
+        # Rendered in a report worker process; the scheduler's loop keeps serving requests
+        pdf = await run_report(render_daily_report, time_threshold)
+
+        if pdf:
+            logger.info(f"Report built: {len(pdf)} bytes")
+            try:
+                await send_email_report(pdf)
+                logger.info(f"Report sent to {settings.MAIL_TO}")
+            except Exception as e:
+                logger.error(f"Failed to send email: {e}")
+        else:
+            logger.info("No feedback to report.")
     except Exception as e:
         import traceback
         logger.error(f"Error generating daily report: {e}")
         logger.error(traceback.format_exc())
 
-def generate_feedback_html(feedback: Feedback) -> str:
+def generate_feedback_html(feedback: Feedback, photos: dict) -> str:
     """Generates HTML body for feedback email with embedded images."""
     
     def get_image_html(img_bytes, label):
@@ -262,9 +165,9 @@ def generate_feedback_html(feedback: Feedback) -> str:
         except Exception:
             return ""
 
-    air_img = get_image_html(feedback.photo_air, "Air Facility Photo")
-    wash_img = get_image_html(feedback.photo_washroom, "Washroom Photo")
-    receipt_img = get_image_html(feedback.photo_receipt, "Receipt Photo")
+    air_img = get_image_html(photos.get("air"), "Air Facility Photo")
+    wash_img = get_image_html(photos.get("washroom"), "Washroom Photo")
+    receipt_img = get_image_html(photos.get("receipt"), "Receipt Photo")
 
     return f'''
     <html>
@@ -292,42 +195,103 @@ def generate_feedback_html(feedback: Feedback) -> str:
     </html>
     '''
 
+async def deliver_negative_report(feedback_id: int):
+    """Builds and mails the negative-feedback alert. Raises on failure so the outbox can retry it."""
+    with Session(engine) as session:
+        feedback = get_feedback(session, feedback_id)
+        if not feedback:
+            logger.error(f"Feedback {feedback_id} not found")
+            return
+        if not conf:
+            logger.warning("Email configuration missing. Skipping immediate negative report.")
+            return
+
+        photos = load_report_photos(session, feedback)
+
+    pdf = await run_report(render_feedback_pdf, feedback_id)
+    if not pdf:
+        logger.error(f"Feedback {feedback_id} deleted before its report was rendered")
+        return
+    html_body = generate_feedback_html(feedback, photos)
+
+    message = MessageSchema(
+        subject="URGENT: Negative Feedback Received",
+        recipients=mail_to_recipients(),
+        body=html_body,
+        subtype=MessageType.html,
+        attachments=[pdf_attachment(pdf, report_filename(f"urgent_report_{feedback_id}"))]
+    )
+    fm = FastMail(conf)
+    await fm.send_message(message)
+    logger.info(f"Immediate report sent to {settings.MAIL_TO}")
+
+def generate_digest_html(ro_code: str, feedbacks) -> str:
+    """HTML body of a negative-feedback digest: one table row per feedback, photos are in the attached PDF."""
+    rows = "".join(f'''
+                <tr>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{f.created_at.strftime('%Y-%m-%d %H:%M')}</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{escape(f.phone)}</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">Air: {f.rating_air or '-'}/3, W/R: {f.rating_washroom or '-'}/3, Water: {f.rating_water or '-'}/3</td>
+                    <td style="padding: 6px; border: 1px solid #ddd;">{escape(f.comment or 'No comment')}</td>
+                </tr>''' for f in feedbacks)
+
+    return f'''
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <h2 style="color: #d9534f;">Negative Feedback Digest</h2>
+            <p><strong>RO Number:</strong> {ro_code}</p>
+            <p>{len(feedbacks)} more negative feedback(s) were received after the last alert for this RO:</p>
+
+            <table style="border-collapse: collapse; font-size: 13px;">
+                <tr style="background-color: #f9f9f9;">
+                    <th style="padding: 6px; border: 1px solid #ddd;">Time</th>
+                    <th style="padding: 6px; border: 1px solid #ddd;">Phone</th>
+                    <th style="padding: 6px; border: 1px solid #ddd;">Ratings</th>
+                    <th style="padding: 6px; border: 1px solid #ddd;">Comment</th>
+                </tr>{rows}
+            </table>
+
+            <p style="font-size: 12px; color: #777; margin-top: 30px;">
+                This is an automated message. Please check the attached PDF for photos and full details.
+            </p>
+        </body>
+    </html>
+    '''
+
+async def deliver_negative_digest(ro_code: str):
+    """Mails one digest of the RO's negative feedback collected since its last alert. Raises on failure so the outbox can retry it."""
+    with Session(engine) as session:
+        feedback_ids = pending_digest_ids(session, ro_code)
+        if not feedback_ids:
+            return # Already sent by an earlier job
+        if not conf:
+            logger.warning("Email configuration missing. Skipping negative feedback digest.")
+            return
+        feedbacks = session.exec(
+            select_feedbacks().where(Feedback.id.in_(feedback_ids)).order_by(Feedback.created_at, Feedback.id)
+        ).all()
+
+    if feedbacks:
+        pdf = await run_report(render_feedbacks_pdf, [f.id for f in feedbacks])
+        message = MessageSchema(
+            subject=f"URGENT: {len(feedbacks)} more negative feedback(s) at RO {ro_code}",
+            recipients=mail_to_recipients(),
+            body=generate_digest_html(ro_code, feedbacks),
+            subtype=MessageType.html,
+            attachments=[pdf_attachment(pdf, report_filename(f"negative_digest_{ro_code}"))]
+        )
+        fm = FastMail(conf)
+        await fm.send_message(message)
+        logger.info(f"Negative feedback digest for {ro_code} ({len(feedbacks)} feedbacks) sent to {settings.MAIL_TO}")
+
+    # Deleted feedback is dropped from the digest but still marked
+    with Session(engine) as session:
+        mark_digest_sent(session, feedback_ids)
+
 async def send_immediate_negative_report(feedback_id: int):
     logger.info(f"Generating immediate negative report for feedback {feedback_id}")
     try:
-        with Session(engine) as session:
-            feedback = session.get(Feedback, feedback_id)
-            if not feedback:
-                logger.error(f"Feedback {feedback_id} not found")
-                return
-
-            filename = f"urgent_report_{feedback_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            generate_pdf([feedback], filename)
-            
-            try:
-                html_body = generate_feedback_html(feedback)
-                if not conf:
-                    logger.warning("Email configuration missing. Skipping immediate negative report.")
-                    return
-
-                # Support multiple recipients (comma-separated)
-                recipients = [email.strip() for email in settings.MAIL_TO.split(',')] if settings.MAIL_TO else []
-                
-                message = MessageSchema(
-                    subject="URGENT: Negative Feedback Received",
-                    recipients=recipients, 
-                    body=html_body,
-                    subtype=MessageType.html,
-                    attachments=[filename]
-                )
-                fm = FastMail(conf)
-                await fm.send_message(message)
-                logger.info(f"Immediate report sent to {settings.MAIL_TO}")
-            except Exception as e:
-                logger.error(f"Failed to send immediate email: {e}")
-            finally:
-                if os.path.exists(filename):
-                    os.remove(filename)
+        await deliver_negative_report(feedback_id)
     except Exception as e:
         logger.error(f"Error generating immediate report: {e}")
 
@@ -339,6 +303,11 @@ def start_scheduler():
             'interval', 
             minutes=settings.REPORT_INTERVAL_MINUTES
         )
+        scheduler.add_job(cleanup_export_jobs, 'interval', hours=1)
+        scheduler.add_job(heartbeat_export_jobs, 'interval', seconds=settings.EXPORT_HEARTBEAT_SECONDS)
+        scheduler.add_job(normalize_pending_media, 'interval', minutes=10)
+        scheduler.add_job(purge_outbox, 'interval', hours=24)
+        scheduler.add_job(purge_negative_alerts, 'interval', hours=24)
         scheduler.start()
         logger.info(f"Scheduler started. Report scheduled every {settings.REPORT_INTERVAL_MINUTES} minutes.")
     except Exception as e:
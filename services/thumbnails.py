@@ -0,0 +1,92 @@
+import io
+from typing import Callable, Iterable, Optional
+
+from PIL import Image, ImageOps
+
+from core.logger import get_logger
+from services.media_store import get_media_store
+
+logger = get_logger(__name__)
+
+# Requested sizes snap up to one of these, so each photo has a handful of cached variants
+THUMBNAIL_SIZES = (150, 320, 640)
+# Generated for every new photo right after upload; the rest are made on first request
+PREGENERATE_SIZES = (150,)
+# format -> (PIL format, media type)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+THUMBNAIL_QUALITY = 80
+
+
+def pick_size(size: int) -> int:
+    """Smallest fixed size >= the requested one (largest if none is)."""
+    for fixed in THUMBNAIL_SIZES:
+        if size <= fixed:
+            return fixed
+    return THUMBNAIL_SIZES[-1]
+
+def pick_format(accept: Optional[str]) -> str:
+    """WebP when the client accepts it, JPEG otherwise."""
+    return "webp" if accept and "image/webp" in accept else "jpeg"
+
+def variant_name(size: int, fmt: str) -> str:
+    return f"thumb-{size}.{fmt}"
+
+def thumbnail_etag_value(source_key: str, size: int, fmt: str) -> str:
+    """Derived from the source hash, so it is known before anything is read or decoded."""
+    return f"{source_key}-{size}-{fmt}"
+
+def is_thumbnailable(data: bytes) -> bool:
+    # PDF receipts have no thumbnail
+    return not data.startswith(b"%PDF")
+
+def render_thumbnail(data: bytes, size: int, fmt: str) -> bytes:
+    """Decodes the image, fits it in size x size (keeping orientation) and encodes it."""
+    pil_format = THUMBNAIL_FORMATS[fmt][0]
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (size, size)) # Lets JPEG decode at reduced scale
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        if img.mode not in ("RGB", "RGBA") or (pil_format == "JPEG" and img.mode == "RGBA"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format=pil_format, quality=THUMBNAIL_QUALITY)
+        return buf.getvalue()
+
+def get_or_create_thumbnail(source_key: str, load_source: Callable[[], Optional[bytes]], size: int, fmt: str) -> Optional[bytes]:
+    """
+    Cached thumbnail for the blob source_key, rendering and storing it on a
+    miss. load_source is only called on a miss. Blocking: run it off the event loop.
+    """
+    store = get_media_store()
+    variant = variant_name(size, fmt)
+    thumb = store.get_derived(source_key, variant)
+    if thumb is not None:
+        return thumb
+
+    data = load_source()
+    if not data or not is_thumbnailable(data):
+        return None
+    thumb = render_thumbnail(data, size, fmt)
+    store.put_derived(source_key, variant, thumb)
+    return thumb
+
+def pregenerate_thumbnails(source_keys: Iterable[str]) -> None:
+    """Renders the PREGENERATE_SIZES variants of newly stored photos. Meant for background tasks."""
+    store = get_media_store()
+    for key in source_keys:
+        try:
+            data = None
+            for size in PREGENERATE_SIZES:
+                for fmt in THUMBNAIL_FORMATS:
+                    if store.get_derived(key, variant_name(size, fmt)) is not None:
+                        continue
+                    if data is None:
+                        data = store.get(key)
+                    if not data or not is_thumbnailable(data):
+                        break
+                    store.put_derived(key, variant_name(size, fmt), render_thumbnail(data, size, fmt))
+        except Exception as e:
+            logger.error(f"Failed to pre-generate thumbnails for {key}: {e}")
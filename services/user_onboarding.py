@@ -5,6 +5,9 @@ import io
 from sqlmodel import Session, select
 from core.security import get_password_hash
 from models import AdminUser, UserROMapping, FOMapping
+from services.access_scope import invalidate_access_scopes
+from services.auth_service import invalidate_principal
+from services.branch_registry import branch_registry
 from models_refactor import Branch
 
 def sanitize_username(name):
@@ -204,6 +207,9 @@ def process_ro_excel_upload(file_content: bytes, session: Session):
 
     try:
         session.commit()
+        invalidate_access_scopes()
+        invalidate_principal() # Upload can change role/branch/city of existing users
+        branch_registry.load(session) # Upload creates/renames branches
         return {
             "success": True, 
             "message": f"Successfully processed {len(df)} rows. Created/Updated {count_users} users and {count_mappings} Branch records. "
@@ -4,9 +4,10 @@ from core.logger import get_logger
 
 logger = get_logger(__name__)
 
-async def send_whatsapp_message(to_number: str, message_body: str):
+async def send_whatsapp_message(to_number: str, message_body: str, raise_errors: bool = False):
     """
     Sends a WhatsApp message using the Meta Cloud API.
+    raise_errors: re-raise API/network failures instead of logging them (used by the outbox to retry).
     """
     if not settings.ENABLE_WHATSAPP:
         logger.info("WhatsApp disabled. Skipping message.")
@@ -38,8 +39,12 @@ async def send_whatsapp_message(to_number: str, message_body: str):
             logger.info(f"WhatsApp message sent to {clean_number}")
     except httpx.HTTPStatusError as e:
         logger.error(f"WhatsApp API Error: {e.response.text}")
+        if raise_errors:
+            raise
     except Exception as e:
         logger.error(f"Failed to send WhatsApp message: {e}")
+        if raise_errors:
+            raise
 
 async def send_interactive_message(to_number: str, body_text: str, buttons: list):
     """
@@ -0,0 +1,100 @@
+"""
+Checks that /api/dashboard/summary returns the same numbers as the individual
+dashboard endpoints it replaces, for the same user and query parameters
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from main import app
+from core.database import get_async_session
+from models import AdminUser, FeedbackDailyRollup
+from services.auth_service import get_current_admin
+from services.cache import dashboard_cache
+from services.access_scope import invalidate_access_scopes
+
+# summary section -> (endpoint, whether it takes roCode/status)
+SECTIONS = {
+    "stats": ("/api/dashboard", True),
+    "dailyComplaints": ("/api/dashboard/daily-complaints", False),
+    "notVerifiedDistribution": ("/api/dashboard/not-verified-distribution", False),
+    "washroomFeedback": ("/api/dashboard/washroom-feedback", False),
+    "freeAirFeedback": ("/api/dashboard/free-air-feedback", False),
+    "drinkingWaterFeedback": ("/api/dashboard/drinking-water-feedback", False),
+}
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "dashboard.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(sync_engine)
+
+    today = datetime.utcnow().date()
+    with Session(sync_engine) as session:
+        for days_ago in (0, 3, 20, 45, 90):
+            for ro in ("RO1", "RO2", None):
+                for status, rating in (("Verified", 3), ("Not Verified", 1), ("Pending", 2)):
+                    session.add(FeedbackDailyRollup(
+                        day=today - timedelta(days=days_ago), ro_number=ro, status=status,
+                        rating_air=rating, rating_washroom=(rating % 3) + 1, rating_water=None if ro is None else rating,
+                        count=days_ago % 7 + (2 if ro == "RO1" else 1),
+                    ))
+        session.commit()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    async def override_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    admin = AdminUser(id="test-super", username="test-super", email="super@test.com", password_hash="-", branch_code="GLOBAL", role="superuser")
+    app.dependency_overrides[get_async_session] = override_session
+    app.dependency_overrides[get_current_admin] = lambda: admin
+    dashboard_cache.invalidate()
+    invalidate_access_scopes()
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    dashboard_cache.invalidate()
+    invalidate_access_scopes()
+
+def without_timestamp(data):
+    if isinstance(data, dict):
+        return {k: v for k, v in data.items() if k != "lastUpdated"}
+    return data
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"roCode": "RO1"},
+    {"status": "Verified"},
+    {"roCode": "RO2", "status": "Not Verified"},
+    {"startDate": "offset:-40"},
+    {"endDate": "offset:-10"},
+    {"startDate": "offset:-60", "endDate": "offset:-2"},
+    {"roCode": "RO1", "startDate": "offset:-25"},
+])
+def test_summary_matches_individual_endpoints(client, params):
+    today = datetime.utcnow().date()
+    params = {
+        k: str(today + timedelta(days=int(v.split(":")[1]))) if str(v).startswith("offset:") else v
+        for k, v in params.items()
+    }
+    r = client.get("/api/dashboard/summary", params=params)
+    assert r.status_code == 200, r.text
+    summary = r.json()["data"]
+
+    for section, (url, takes_filters) in SECTIONS.items():
+        query = params if takes_filters else {k: v for k, v in params.items() if k in ("startDate", "endDate")}
+        r = client.get(url, params=query)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        expected = body["data"] if section in ("stats", "dailyComplaints", "notVerifiedDistribution") else {"data": body["data"], "total": body["total"]}
+        assert without_timestamp(summary[section]) == without_timestamp(expected), (section, params)
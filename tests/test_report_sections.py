@@ -0,0 +1,55 @@
+"""
+Tests for the per-RO section files behind the scoped daily reports
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from models import Feedback
+from services import reports
+from services.reports import ReportRow, _SectionWriter, prepare_ro_sections, render_scope_report
+
+
+def make_row(i, ro_number, rating_air=2):
+    return ReportRow(i, datetime(2025, 1, 1), ro_number, "web", "9999999999", rating_air, 3, f"c{i}")
+
+def test_writer_merges_repeated_ro(tmp_path):
+    # PostgreSQL sorts "" first and NULL last, so the "-" group can arrive in two runs
+    writer = _SectionWriter(str(tmp_path))
+    writer.add("-", make_row(1, "", 1), {})
+    writer.add("RO1", make_row(2, "RO1"), {})
+    writer.add("-", make_row(3, None, 3), {})
+    writer.flush()
+
+    assert writer.manifest["-"]["count"] == 2
+    assert writer.manifest["-"]["air_sum"] == 4 and writer.manifest["-"]["air_n"] == 2
+    assert len(writer.manifest["-"]["paths"]) == 2
+    assert len(set(writer.manifest["-"]["paths"] + writer.manifest["RO1"]["paths"])) == 3
+
+def test_null_and_empty_ro_share_one_section(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'report.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(reports, "engine", engine)
+
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for i, ro in enumerate([None, "", "RO1", None, "", "RO2"]):
+            session.add(Feedback(
+                phone="9999999999", rating_air=2, rating_washroom=3, terms_accepted=True,
+                ro_number=ro, feedback_method="web", created_at=now - timedelta(minutes=i),
+            ))
+        session.commit()
+
+    sections_dir = tmp_path / "sections"
+    sections_dir.mkdir()
+    manifest = prepare_ro_sections(str(sections_dir), now - timedelta(hours=1))
+
+    assert sorted(manifest) == ["-", "RO1", "RO2"]
+    assert manifest["-"]["count"] == 4
+    assert sum(entry["count"] for entry in manifest.values()) == 6
+    assert render_scope_report("All ROs", list(manifest.values())).startswith(b"%PDF")